@@ -0,0 +1,187 @@
+# bench_comment_queries.py
+"""
+Query latency benchmark for the comments table.
+
+Builds a throwaway database with the pre-index schema (no thread_root, no
+indexes), times the read paths used by the pipeline, then runs init_db() to
+apply the thread_root backfill + indexes and times the same paths again.
+
+    python bench_comment_queries.py                       # 1M rows, 200 videos
+    python bench_comment_queries.py --rows 200000 --videos 50 --samples 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from storage import connection
+from storage import database
+
+SENTIMENT_LABELS = ["positive", "negative", "neutral"]
+REPLY_RATIO = 0.5           # Share of rows that are replies
+INSERT_CHUNK = 50_000
+
+# The same queries as before the schema upgrade, for the baseline numbers
+LEGACY_QUERIES = {
+    "get_all_comments": ("""
+        SELECT * FROM comments
+        WHERE video_id = ?
+        ORDER BY
+            COALESCE(parent_id, comment_id),
+            parent_id IS NOT NULL,
+            created_at ASC
+    """, "video"),
+    "get_comments_by_sentiment": ("""
+        SELECT * FROM comments
+        WHERE video_id = ? AND sentiment_label = ?
+        ORDER BY sentiment_score DESC
+    """, "video_label"),
+    "get_replies": ("""
+        SELECT * FROM comments
+        WHERE parent_id = ?
+        ORDER BY created_at ASC
+    """, "parent"),
+    "get_comments": ("""
+        SELECT * FROM comments
+        WHERE video_id = ? AND parent_id IS NULL
+        ORDER BY like_count DESC
+    """, "video"),
+}
+
+
+# ── Data ──────────────────────────────────────────────────
+
+def build_legacy_db(path: str, n_rows: int, n_videos: int) -> list[str]:
+    """Create the old comments schema and fill it; returns sampled parent ids"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE comments (
+            comment_id      TEXT PRIMARY KEY,
+            video_id        TEXT,
+            parent_id       TEXT,
+            username        TEXT,
+            text            TEXT,
+            like_count      INTEGER DEFAULT 0,
+            reply_count     INTEGER DEFAULT 0,
+            created_at      TIMESTAMP,
+            fetched_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            clean_text      TEXT,
+            sentiment_label TEXT,
+            sentiment_score REAL
+        );
+    """)
+
+    rng = random.Random(42)
+    parents = {f"vid{v:04d}": [] for v in range(n_videos)}
+    sample_parents = []
+    rows = []
+    for i in range(n_rows):
+        video_id = f"vid{rng.randrange(n_videos):04d}"
+        comment_id = f"c{i:08d}"
+        threads = parents[video_id]
+        parent_id = rng.choice(threads) if threads and rng.random() < REPLY_RATIO else None
+        if parent_id is None:
+            threads.append(comment_id)
+            if rng.random() < 0.001:
+                sample_parents.append(comment_id)
+        rows.append((
+            comment_id, video_id, parent_id, f"user{rng.randrange(50_000)}",
+            "lorem ipsum dolor sit amet " * rng.randint(1, 6),
+            rng.randrange(1000), 0,
+            f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z",
+            rng.choice(SENTIMENT_LABELS), rng.random(),
+        ))
+        if len(rows) >= INSERT_CHUNK:
+            _insert(conn, rows)
+            rows = []
+    _insert(conn, rows)
+    conn.close()
+    return sample_parents
+
+
+def _insert(conn: sqlite3.Connection, rows: list[tuple]):
+    with conn:
+        conn.executemany("""
+            INSERT INTO comments
+                (comment_id, video_id, parent_id, username, text, like_count,
+                 reply_count, created_at, sentiment_label, sentiment_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+# ── Timing ──────────────────────────────────────────────────
+
+def _args_for(kind: str, rng: random.Random, n_videos: int, parents: list[str]) -> tuple:
+    video_id = f"vid{rng.randrange(n_videos):04d}"
+    if kind == "video":
+        return (video_id,)
+    if kind == "video_label":
+        return (video_id, rng.choice(SENTIMENT_LABELS))
+    return (rng.choice(parents),)
+
+
+def time_calls(fn, make_args, samples: int) -> float:
+    """Median latency in ms"""
+    timings = []
+    for _ in range(samples):
+        args = make_args()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run(n_rows: int, n_videos: int, samples: int):
+    tmp_dir = tempfile.mkdtemp(prefix="bench_comments_")
+    db_path = os.path.join(tmp_dir, "bench.db")
+
+    start = time.perf_counter()
+    parents = build_legacy_db(db_path, n_rows, n_videos)
+    print(f"[Bench] {n_rows:,} rows / {n_videos} videos built in {time.perf_counter() - start:.1f}s")
+
+    connection.DB_PATH = db_path
+    legacy = {}
+    for name, (sql, kind) in LEGACY_QUERIES.items():
+        rng = random.Random(7)
+        conn = connection.get_connection()
+        legacy[name] = time_calls(
+            lambda *args: conn.execute(sql, args).fetchall(),
+            lambda: _args_for(kind, rng, n_videos, parents),
+            samples,
+        )
+
+    start = time.perf_counter()
+    database.init_db()
+    print(f"[Bench] init_db migration (thread_root backfill + indexes) took {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{'query':<28} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name, (_, kind) in LEGACY_QUERIES.items():
+        rng = random.Random(7)
+        after = time_calls(
+            getattr(database, name),
+            lambda: _args_for(kind, rng, n_videos, parents),
+            samples,
+        )
+        print(f"{name:<28} {legacy[name]:>10.2f} {after:>10.2f} {legacy[name] / after:>7.1f}x")
+
+    connection.close_connection()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.rmdir(tmp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark comment query latency before/after indexing")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=30, help="calls per query (median reported)")
+    args = parser.parse_args()
+    run(args.rows, args.videos, args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import json
 import google.generativeai as genai
 from pydantic import BaseModel, Field
 from config import GEMINI_API_KEY, YOUTUBE_API_KEY
+from storage.database import get_stored_transcript, get_sentiment_aggregates
 
 
 # ═══════════════════════════════════════════════════════════
@@ -37,10 +38,10 @@ def setup_gemini():
 # Sentiment Analysis
 # ═══════════════════════════════════════════════════════════
 
-def analyze_sentiment_data(video_id: str, directory: str = "comments"):
+def _aggregate_clean_file(video_id: str, directory: str):
     """
-    Analyze sentiment from {video_id}_clean.txt
-    Returns: dict with sentiment statistics (包含三种情感)
+    Same shape as get_sentiment_aggregates, computed from {video_id}_clean.txt
+    (used when the DB has no aggregates, e.g. local file-only tests)
     """
     file_path = os.path.join(directory, f"{video_id}_clean.txt")
 
@@ -48,46 +49,61 @@ def analyze_sentiment_data(video_id: str, directory: str = "comments"):
         print(f"  ⚠️  Sentiment file not found: {file_path}")
         return None
 
-    print(f"  [Gemini] Analyzing sentiment data...")
-
-    positive_weighted = 0.0
-    negative_weighted = 0.0
-    neutral_weighted = 0.0  # ← 包含中性
-    total_sentiment_score = 0.0
-    total_comments = 0
-
-    sentiment_counts = {"positive": 0, "negative": 0, "neutral": 0}
-
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
             comments = json.load(file)
+    except Exception as e:
+        print(f"  ⚠️  Error analyzing sentiment: {e}")
+        return None
 
-        for comment in comments:
-            like_count = comment.get("like_count", 0)
-            sentiment_score = comment.get("sentiment_score", 0.0)
-            sentiment_label = comment.get("sentiment_label", "").lower()
+    aggregates = {}
+    for comment in comments:
+        like_count = comment.get("like_count", 0)
+        sentiment_score = comment.get("sentiment_score", 0.0)
+        sentiment_label = comment.get("sentiment_label", "").lower()
 
-            # Weighted score: higher likes = higher weight
-            weighted_score = (1 + 0.05 * like_count) * sentiment_score
+        agg = aggregates.setdefault(sentiment_label, {"count": 0, "weighted_sum": 0.0, "score_sum": 0.0})
+        agg["count"] += 1
+        agg["weighted_sum"] += (1 + 0.05 * like_count) * sentiment_score
+        agg["score_sum"] += sentiment_score
+    return aggregates
 
-            if sentiment_label == "positive":
-                positive_weighted += weighted_score
-                sentiment_counts["positive"] += 1
-            elif sentiment_label == "negative":
-                negative_weighted += weighted_score
-                sentiment_counts["negative"] += 1
-            elif sentiment_label == "neutral":
-                neutral_weighted += weighted_score
-                sentiment_counts["neutral"] += 1
 
-            total_sentiment_score += sentiment_score
-            total_comments += 1
+def analyze_sentiment_data(video_id: str, directory: str = "comments"):
+    """
+    Analyze sentiment from the per-video aggregates kept in the database
+    (counts and like-weighted sums are maintained as comments are analyzed),
+    falling back to the exported {video_id}_clean.txt
+    Returns: dict with sentiment statistics (包含三种情感)
+    """
+    print(f"  [Gemini] Analyzing sentiment data...")
 
-    except Exception as e:
-        print(f"  ⚠️  Error analyzing sentiment: {e}")
-        return None
+    try:
+        aggregates = get_sentiment_aggregates(video_id)
+    except Exception:
+        aggregates = None   # DB not initialised (e.g. local file-only tests)
+    if not aggregates:
+        aggregates = _aggregate_clean_file(video_id, directory)
+        if aggregates is None:
+            return None
+
+    def weighted(label: str) -> float:
+        return aggregates.get(label, {}).get("weighted_sum", 0.0)
+
+    # Weighted score: (1 + 0.05 * like_count) * sentiment_score, higher likes = higher weight
+    positive_weighted = weighted("positive")
+    negative_weighted = weighted("negative")
+    neutral_weighted = weighted("neutral")  # ← 包含中性
+
+    sentiment_counts = {
+        label: aggregates.get(label, {}).get("count", 0)
+        for label in ("positive", "negative", "neutral")
+    }
+    total_comments = sum(agg["count"] for agg in aggregates.values())
+    total_sentiment_score = sum(agg["score_sum"] for agg in aggregates.values())
 
     if total_comments == 0:
+        print(f"  ⚠️  No analyzed comments for {video_id}")
         return None
 
     # Calculate percentages (包含三种情感)
@@ -121,11 +137,19 @@ def analyze_sentiment_data(video_id: str, directory: str = "comments"):
 # Transcript Summarization
 # ═══════════════════════════════════════════════════════════
 
-def summarize_transcript(video_id: str, product_name: str, sentiment_data: dict, directory: str = "comments"):
+def read_transcript(video_id: str, directory: str = "comments"):
     """
-    Use Gemini to generate structured summary from video transcript
-    传入情感数据以获得更准确的评分
+    Transcript text from the DB cache (written by transcript.get_transcript),
+    falling back to the exported {video_id}_transcript.txt
     """
+    try:
+        cached = get_stored_transcript(video_id)
+    except Exception:
+        cached = None   # DB not initialised (e.g. local file-only tests)
+    if cached:
+        print(f"  [Gemini] Using cached transcript ({cached['language']})")
+        return f"Language: {cached['language']}\n" + "=" * 60 + "\n\n" + cached["transcript"]
+
     file_path = os.path.join(directory, f"{video_id}_transcript.txt")
 
     if not os.path.exists(file_path):
@@ -136,11 +160,21 @@ def summarize_transcript(video_id: str, product_name: str, sentiment_data: dict,
 
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
-            transcript_content = file.read()
+            return file.read()
     except Exception as e:
         print(f"  ⚠️  Error reading transcript: {e}")
         return None
 
+
+def summarize_transcript(video_id: str, product_name: str, sentiment_data: dict, directory: str = "comments"):
+    """
+    Use Gemini to generate structured summary from video transcript
+    传入情感数据以获得更准确的评分
+    """
+    transcript_content = read_transcript(video_id, directory)
+    if transcript_content is None:
+        return None
+
     # 构造包含情感数据的 prompt
     sentiment_context = ""
     if sentiment_data:
@@ -203,6 +237,19 @@ Transcript:
 # Full Analysis
 # ═══════════════════════════════════════════════════════════
 
+def get_recommendation(score: int) -> tuple[str, str]:
+    """Returns: (verdict, type) for a 1-100 product score"""
+    if score >= 80:
+        return "Strong Buy", "buy"
+    if score >= 60:
+        return "Buy", "buy"
+    if score >= 50:
+        return "Consider", "consider"
+    if score >= 40:
+        return "Don't Buy", "dont-buy"
+    return "Strong Don't Buy", "dont-buy"
+
+
 def generate_full_analysis(video_id: str, product_name: str, directory: str = "comments"):
     """
     Combine sentiment + transcript analysis
@@ -247,22 +294,7 @@ def generate_full_analysis(video_id: str, product_name: str, directory: str = "c
     # 3. Determine recommendation
     positive_pct = sentiment_data['positive_percentage']
     score = transcript_summary['product_score']
-
-    if score >= 80:
-        verdict = "Strong Buy"
-        rec_type = "buy"
-    elif score >= 60:
-        verdict = "Buy"
-        rec_type = "buy"
-    elif score >= 50:
-        verdict = "Consider"
-        rec_type = "consider"
-    elif score >= 40:
-        verdict = "Don't Buy"
-        rec_type = "dont-buy"
-    else:
-        verdict = "Strong Don't Buy"
-        rec_type = "dont-buy"
+    verdict, rec_type = get_recommendation(score)
 
     # 4. Format for frontend
     result = {
@@ -305,6 +337,73 @@ def generate_full_analysis(video_id: str, product_name: str, directory: str = "c
     return result
 
 
+# ═══════════════════════════════════════════════════════════
+# Multi-video Merge
+# ═══════════════════════════════════════════════════════════
+
+def merge_analysis_results(product_name: str, results: list[dict], max_items: int = 7):
+    """
+    Merge per-video results from generate_full_analysis into one product result
+    Percentages / scores are weighted by each video's totalReviews
+    """
+    results = [r for r in results if r]
+    if not results:
+        return None
+    if len(results) == 1:
+        return results[0]
+
+    weights = [max(r['totalReviews'], 1) for r in results]
+    total_weight = sum(weights)
+
+    def weighted(get) -> float:
+        return sum(get(r) * w for r, w in zip(results, weights)) / total_weight
+
+    score = int(round(weighted(lambda r: r['value']['score'])))
+    verdict, rec_type = get_recommendation(score)
+
+    # Most-reviewed video leads; pros/cons interleaved across videos, deduplicated
+    ranked = sorted(results, key=lambda r: r['totalReviews'], reverse=True)
+
+    def interleave(key: str) -> list[str]:
+        merged, seen = [], set()
+        for i in range(max(len(r[key]) for r in ranked)):
+            for r in ranked:
+                if i < len(r[key]) and r[key][i].lower() not in seen:
+                    seen.add(r[key][i].lower())
+                    merged.append(r[key][i])
+        return merged[:max_items]
+
+    return {
+        "product": product_name,
+        "confidence": int(round(weighted(lambda r: r['confidence']))),
+        "recommendation": {
+            "verdict": verdict,
+            "type": rec_type,
+            "summary": ranked[0]['recommendation']['summary']
+        },
+        "sentiment": {
+            "positive": round(weighted(lambda r: r['sentiment']['positive']), 1),
+            "neutral": round(weighted(lambda r: r['sentiment']['neutral']), 1),
+            "negative": round(weighted(lambda r: r['sentiment']['negative']), 1)
+        },
+        "totalReviews": sum(r['totalReviews'] for r in results),
+        "value": {
+            "score": score,
+            "description": ranked[0]['value']['description']
+        },
+        "pros": interleave('pros'),
+        "cons": interleave('cons'),
+        "sources": [
+            {
+                "platform": "youtube",
+                "name": "YouTube",
+                "count": sum(r['totalReviews'] for r in results),
+                "videos": len(results)
+            }
+        ]
+    }
+
+
 # ═══════════════════════════════════════════════════════════
 # Export Function (补上这个函数)
 # ═══════════════════════════════════════════════════════════
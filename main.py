@@ -1,21 +1,48 @@
 import json
 import os
-
-import httpx
-from config import YOUTUBE_API_KEY, MAX_VIDEOS, MAX_COMMENTS_PER_VIDEO
-from storage.database import init_db, save_video, save_comments, get_all_comments
+import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, fields
+
+from config import MAX_VIDEOS, MAX_COMMENTS_PER_VIDEO
+from storage.database import init_db, save_video, save_comments
+from storage.database import get_sync_state, update_comment_metrics
+from storage.database import save_search_result, get_search_result
+from storage.database import iter_comments, iter_comment_chunks, count_comments
 from storage.models import Video, Comment
-from preprocess import preprocess_comments
-from sentiment import analyze_batch
-from storage.database import save_sentiment, get_sentiment_summary, get_comments_by_sentiment
-from transcript import fetch_transcript_auto, export_transcript
-from gemini_analysis import generate_full_analysis, export_analysis_json
-
-VIDEO_URL = "https://www.googleapis.com/youtube/v3/videos"
-SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
-THREADS_URL = "https://www.googleapis.com/youtube/v3/commentThreads"
-COMMENTS_URL = "https://www.googleapis.com/youtube/v3/comments"
+from scraper.comment_fetcher import AsyncCommentFetcher, DEFAULT_CONCURRENCY
+from scraper.http_client import api_get, iter_async, run_async
+from scraper.quota import get_budget, endpoint_cost, plan_comment_crawl, QuotaExceededError
+from preprocess import preprocess_comment
+from sentiment import analyze_batch, SENTIMENT_BATCH_SIZE
+from sentiment import inference_slots as _inference_slots   # sentiment model calls, shared with reviews
+from storage.database import save_sentiment, get_sentiment_summary, mark_comments_skipped, SKIPPED_LABEL
+from transcript import get_transcript, export_transcript
+from gemini_analysis import generate_full_analysis, export_analysis_json, merge_analysis_results
+
 COMMENTS_DIR = "comments"
+HOT_THREADS = 100   # Threads whose like/reply counts are refreshed on re-analysis
+SEARCH_CACHE_TTL_HOURS = 24     # Cached searches are served as-is while younger than this
+SEARCH_STALE_HOURS = 24 * 6     # ...and served + refreshed in the background for this much longer
+
+# Per-stage parallelism when several videos are processed at once
+NETWORK_WORKERS = 3     # videos crawling transcript + comments at the same time
+GEMINI_WORKERS = 2      # concurrent Gemini requests
+VIDEO_WORKERS = 4       # videos in process_video at once; the rest wait in the pool queue
+
+_network_slots = threading.BoundedSemaphore(NETWORK_WORKERS)
+_gemini_slots = threading.BoundedSemaphore(GEMINI_WORKERS)
+
+# Streaming crawl → preprocess → sentiment
+STREAM_QUEUE_PAGES = 4      # comment pages buffered between crawl and preprocessing
+STREAM_QUEUE_BATCHES = 2    # micro-batches buffered ahead of the sentiment model
+COMMENT_FIELDS = [f.name for f in fields(Comment)]   # Columns re-queued for unanalyzed comments
+_STREAM_DONE = object()
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
 
 
 # ── Video Search ──────────────────────────────────────────────────
@@ -61,15 +88,13 @@ def _mode_search() -> tuple[list[Video], str]:
 #
 #     # Batch fetch video info
 #     video_ids = [get_video_id_from_url(u) for u in urls]
-#     resp = httpx.get(VIDEO_URL, params={
-#         "key":  YOUTUBE_API_KEY,
+#     items = api_get("videos", {
 #         "id":   ",".join(video_ids),
 #         "part": "snippet,statistics",
-#     })
-#     resp.raise_for_status()
+#     }).get("items", [])
 #
 #     videos = []
-#     for item in resp.json().get("items", []):
+#     for item in items:
 #         stats   = item.get("statistics", {})
 #         snippet = item.get("snippet", {})
 #         videos.append(Video(
@@ -83,33 +108,89 @@ def _mode_search() -> tuple[list[Video], str]:
 #
 #     return videos
 
-def search_videos(keyword: str, max_results: int = 2) -> list[Video]:
+def normalize_keyword(keyword: str) -> str:
+    """Lowercase, drop punctuation, collapse spaces: "M4 MacBook-Air!" → "m4 macbook air" """
+    return " ".join(re.sub(r"[^\w\s]", " ", keyword.lower()).split())
+
+
+def search_videos(keyword: str, max_results: int = 2, use_cache: bool = True) -> list[Video]:
+    """
+    Search review videos for a product.
+    Results are cached per normalized keyword: fresh hits skip the 100-unit search call,
+    stale hits (within SEARCH_STALE_HOURS) are served immediately and refreshed in the background
+    """
     print(f"[VideoSearcher] Searching: '{keyword} review'")
+    cache_key = normalize_keyword(keyword)
+
+    cached = get_search_result(cache_key) if use_cache else None
+    # A search that asked for at least as many results is complete even if it
+    # returned fewer (niche products); only a smaller earlier request is a miss
+    if cached and cached["max_results"] >= max_results:
+        age_hours = cached["age_seconds"] / 3600
+        if age_hours < SEARCH_CACHE_TTL_HOURS + SEARCH_STALE_HOURS:
+            if age_hours >= SEARCH_CACHE_TTL_HOURS:
+                _refresh_search_async(keyword, cache_key, max_results)
+            print(f"[VideoSearcher] Using cached search ({age_hours:.1f}h old)")
+            return _fetch_video_stats(cached["video_ids"][:max_results])
+
+    return _search_and_cache(keyword, cache_key, max_results)
+
+
+def _refresh_search_async(keyword: str, cache_key: str, max_results: int):
+    """Stale-while-revalidate: at most one background refresh per keyword"""
+    with _refreshing_lock:
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+
+    # Only the video id list is refreshed: stats are fetched per request anyway,
+    # so re-reading them here would spend videos quota for nothing
+    def refresh():
+        try:
+            with get_budget().reserve(endpoint_cost("search"), "search"):
+                _search_ids(keyword, cache_key, max_results)
+        except Exception as e:
+            print(f"[VideoSearcher] Background refresh failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(cache_key)
 
-    resp = httpx.get(SEARCH_URL, params={
-        "key": YOUTUBE_API_KEY,
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def _search_and_cache(keyword: str, cache_key: str, max_results: int) -> list[Video]:
+    with get_budget().reserve(endpoint_cost("search") + endpoint_cost("videos"), "search"):
+        video_ids = _search_ids(keyword, cache_key, max_results)
+        if not video_ids:
+            return []
+        return _fetch_video_stats(video_ids)
+
+
+def _search_ids(keyword: str, cache_key: str, max_results: int) -> list[str]:
+    """The search call alone, stored in search_cache; the caller reserves its quota"""
+    items = api_get("search", {
         "q": f"{keyword} review",
         "part": "snippet",
         "type": "video",
         "maxResults": max_results,
         "relevanceLanguage": "en",
-    })
-    resp.raise_for_status()
-    items = resp.json().get("items", [])
+    }).get("items", [])
     if not items:
         return []
 
     video_ids = [item["id"]["videoId"] for item in items]
+    save_search_result(cache_key, video_ids, max_results)
+    return video_ids
+
 
-    stats_resp = httpx.get(VIDEO_URL, params={
-        "key": YOUTUBE_API_KEY,
+def _fetch_video_stats(video_ids: list[str]) -> list[Video]:
+    stats_items = api_get("videos", {
         "id": ",".join(video_ids),
         "part": "snippet,statistics",
-    })
-    stats_resp.raise_for_status()
+    }).get("items", [])
 
     videos = []
-    for item in stats_resp.json().get("items", []):
+    for item in stats_items:
         stats = item.get("statistics", {})
         snippet = item.get("snippet", {})
         videos.append(Video(
@@ -128,191 +209,226 @@ def search_videos(keyword: str, max_results: int = 2) -> list[Video]:
 # ── Comment Fetching ──────────────────────────────────────────────────
 
 def fetch_replies(parent_id: str, video_id: str) -> list[Comment]:
-    replies = []
-    next_page_token = None
-
-    while True:
-        params = {
-            "key": YOUTUBE_API_KEY,
-            "parentId": parent_id,
-            "part": "snippet",
-            "maxResults": 100,
-        }
-        if next_page_token:
-            params["pageToken"] = next_page_token
+    return run_async(AsyncCommentFetcher().fetch_replies(parent_id, video_id))
 
-        try:
-            resp = httpx.get(COMMENTS_URL, params=params, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
-        except Exception as e:
-            print(f"    [Reply] Request failed: {e}")
-            break
-
-        for item in data.get("items", []):
-            s = item["snippet"]
-            replies.append(Comment(
-                comment_id=item["id"],
-                video_id=video_id,
-                parent_id=parent_id,
-                username=s.get("authorDisplayName", ""),
-                text=s.get("textOriginal", ""),
-                like_count=s.get("likeCount", 0),
-                reply_count=0,
-                created_at=s.get("publishedAt", ""),
-            ))
-
-        next_page_token = data.get("nextPageToken")
-        if not next_page_token:
-            break
-
-    return replies
-
-
-def fetch_all_comments(video_id: str, max_pages_per_order: int = 3) -> list[Comment]:
+
+def fetch_all_comments(video_id: str, max_pages_per_order: int = 3,
+                       concurrency: int = DEFAULT_CONCURRENCY) -> list[Comment]:
     """
     Fetch comments using two strategies and deduplicate:
     1. Relevance order (hot/popular comments) - 3 pages
     2. Time order (newest comments) - 3 pages
+    Both orders and all reply crawls run concurrently (at most `concurrency` requests in flight)
+    Pages / reply expansion are scaled down when the daily quota is low
     """
-    all_comments = []
-    seen_ids = set()
-
-    # Strategy 1: Hot/Popular comments (relevance)
-    print("\n  [Strategy 1] Fetching popular comments (relevance order)...")
-    relevance_comments = _fetch_comments_by_order(
-        video_id,
-        order="relevance",
-        max_pages=max_pages_per_order
-    )
-    for comment in relevance_comments:
-        if comment.comment_id not in seen_ids:
-            all_comments.append(comment)
-            seen_ids.add(comment.comment_id)
-
-    print(f"  → Got {len(all_comments)} unique comments from relevance order")
-
-    # Strategy 2: Newest comments (time)
-    print("\n  [Strategy 2] Fetching newest comments (time order)...")
-    time_comments = _fetch_comments_by_order(
-        video_id,
-        order="time",
-        max_pages=max_pages_per_order
-    )
-    new_count = 0
-    for comment in time_comments:
-        if comment.comment_id not in seen_ids:
-            all_comments.append(comment)
-            seen_ids.add(comment.comment_id)
-            new_count += 1
+    plan = plan_comment_crawl(max_pages_per_order)
+    with get_budget().reserve(plan.units, f"comments:{video_id}"):
+        fetcher = AsyncCommentFetcher(concurrency=concurrency, expand_replies=plan.expand_replies)
+        return run_async(fetcher.fetch_all(video_id, plan.max_pages_per_order))
+
 
-    print(f"  → Got {new_count} new comments from time order")
-    print(f"  → Total unique comments: {len(all_comments)}")
+def sync_comments(video_id: str, max_pages_per_order: int = 3, hot_threads: int = HOT_THREADS,
+                  concurrency: int = DEFAULT_CONCURRENCY, state: dict = None) -> list[Comment]:
+    """
+    Delta sync for videos that were crawled before: time order stops at the first
+    stored comment, and like/reply counts are refreshed for the hot top-N threads only.
+    Falls back to fetch_all_comments on the first crawl.
+    Returns only comments that are not stored yet (new threads and new replies),
+    for save_comments; the refreshed counts of stored threads are written here
+    """
+    state = state or get_sync_state(video_id)
+    if not state["reply_counts"]:
+        return fetch_all_comments(video_id, max_pages_per_order, concurrency)
+
+    plan = plan_comment_crawl(max_pages_per_order)
+    with get_budget().reserve(plan.units, f"comments:{video_id}"):
+        fetcher = AsyncCommentFetcher(concurrency=concurrency, expand_replies=plan.expand_replies)
+        new_comments, refreshed = run_async(fetcher.fetch_delta(
+            video_id, state, max_pages=plan.max_pages_per_order, hot_threads=hot_threads,
+        ))
 
-    return all_comments
+    refreshed_counts = update_comment_metrics(refreshed)
+    print(f"  [{video_id}] Hot threads: {refreshed_counts['updated']} with changed likes/replies, "
+          f"{refreshed_counts['unchanged']} unchanged")
+    return new_comments
 
 
-def _fetch_comments_by_order(video_id: str, order: str, max_pages: int) -> list[Comment]:
+def stream_comments(video_id: str, max_pages_per_order: int = 3,
+                    concurrency: int = DEFAULT_CONCURRENCY):
     """
-    Helper function to fetch comments with specific order
-    order: "relevance" or "time"
+    Same crawl as fetch_all_comments, but yields each page's unique comments
+    (list[Comment]) as soon as it arrives, so callers can start early
     """
-    comments = []
-    next_page_token = None
-    page = 1
-
-    while page <= max_pages:
-        params = {
-            "key": YOUTUBE_API_KEY,
-            "videoId": video_id,
-            "part": "snippet,replies",
-            "maxResults": 100,
-            "order": order,
-        }
-        if next_page_token:
-            params["pageToken"] = next_page_token
+    plan = plan_comment_crawl(max_pages_per_order)
+    with get_budget().reserve(plan.units, f"comments:{video_id}"):
+        fetcher = AsyncCommentFetcher(concurrency=concurrency, expand_replies=plan.expand_replies)
+        yield from iter_async(fetcher.stream_unique(video_id, plan.max_pages_per_order))
 
-        try:
-            resp = httpx.get(THREADS_URL, params=params, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
-        except Exception as e:
-            print(f"    [Page {page}] Request failed: {e}")
-            break
-
-        for item in data.get("items", []):
-            top = item["snippet"]["topLevelComment"]["snippet"]
-            comment_id = item["snippet"]["topLevelComment"]["id"]
-            reply_count = item["snippet"].get("totalReplyCount", 0)
-
-            comments.append(Comment(
-                comment_id=comment_id,
-                video_id=video_id,
-                parent_id=None,
-                username=top.get("authorDisplayName", ""),
-                text=top.get("textOriginal", ""),
-                like_count=top.get("likeCount", 0),
-                reply_count=reply_count,
-                created_at=top.get("publishedAt", ""),
-            ))
-
-            if reply_count > 0:
-                embedded = item.get("replies", {}).get("comments", [])
-                if reply_count <= len(embedded):
-                    for r in embedded:
-                        s = r["snippet"]
-                        comments.append(Comment(
-                            comment_id=r["id"],
-                            video_id=video_id,
-                            parent_id=comment_id,
-                            username=s.get("authorDisplayName", ""),
-                            text=s.get("textOriginal", ""),
-                            like_count=s.get("likeCount", 0),
-                            reply_count=0,
-                            created_at=s.get("publishedAt", ""),
-                        ))
-                else:
-                    print(f"    └─ Fetching {reply_count} replies...")
-                    comments.extend(fetch_replies(comment_id, video_id))
-
-        top_count = sum(1 for c in comments if c.parent_id is None)
-        reply_count_total = sum(1 for c in comments if c.parent_id is not None)
-        print(f"    Page {page}/{max_pages} ({order}): Top-level {top_count}, Replies {reply_count_total}")
-
-        next_page_token = data.get("nextPageToken")
-        if not next_page_token:
-            print(f"    Reached last page at page {page}")
-            break
-
-        page += 1
-
-    return comments
+
+def stream_new_comments(video_id: str, max_pages_per_order: int = 3,
+                        concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    sync_comments as a page stream: a first crawl yields pages as they arrive,
+    a delta sync (already small) yields its new comments as one page
+    """
+    state = get_sync_state(video_id)
+    if state["reply_counts"]:
+        yield sync_comments(video_id, max_pages_per_order, concurrency=concurrency, state=state)
+    else:
+        yield from stream_comments(video_id, max_pages_per_order, concurrency)
+
+
+# ── Streaming Sentiment ──────────────────────────────────────────────────
+
+def _run_stage(target, out_queue: queue.Queue, errors: list, *args):
+    """Thread body for a pipeline stage; always ends its output with _STREAM_DONE"""
+    try:
+        target(*args, out_queue)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        out_queue.put(_STREAM_DONE)
+
+
+def _crawl_stage(video_id: str, pages, stop: threading.Event, out_queue: queue.Queue):
+    # Comments stored earlier but never analyzed (e.g. an interrupted run) go first
+    for pending in iter_comment_chunks(video_id, columns=COMMENT_FIELDS, unanalyzed_only=True):
+        if stop.is_set():
+            return
+        out_queue.put(pending)
+    stored = {"inserted": 0, "updated": 0, "unchanged": 0}
+    # Only the download holds a network slot, and it is released before the
+    # hand-off so a full out_queue never keeps other videos from crawling;
+    # inference is bounded by _inference_slots
+    try:
+        page_iter = iter(pages)
+        while True:
+            with _network_slots:
+                page = next(page_iter, None)
+                if page is None:
+                    break
+                for key, n in save_comments(page).items():
+                    stored[key] += n
+            if stop.is_set():
+                return
+            out_queue.put([asdict(c) for c in page])
+    finally:
+        if hasattr(pages, "close"):
+            pages.close()   # also closes an async crawl still running on the shared loop
+    print(f"  [{video_id}] Stored comments: {stored['inserted']} new, "
+          f"{stored['updated']} with updated likes/replies, {stored['unchanged']} unchanged")
+
+
+def _preprocess_stage(in_queue: queue.Queue, stop: threading.Event, out_queue: queue.Queue):
+    batch = []
+    while (page := in_queue.get()) is not _STREAM_DONE:
+        if stop.is_set():
+            return
+        skipped = []
+        for c in page:
+            cleaned = preprocess_comment(c)
+            if cleaned is not None:
+                batch.append(cleaned)
+            else:
+                skipped.append(c["comment_id"])
+            if len(batch) >= SENTIMENT_BATCH_SIZE:
+                out_queue.put(batch)
+                batch = []
+        # Filtered comments leave the unanalyzed queue instead of being re-read every run
+        if skipped:
+            mark_comments_skipped(skipped)
+    if batch:
+        out_queue.put(batch)
+
+
+def analyze_comment_stream(video_id: str, pages) -> int:
+    """
+    Streaming crawl → preprocess → sentiment pipeline for one video.
+    Each page from `pages` (e.g. stream_new_comments) is saved and flows through
+    normalize / is_valid into micro-batches for the sentiment model while later
+    pages are still downloading. Bounded queues between the stages provide
+    backpressure. Returns the number of comments analyzed.
+    """
+    page_queue = queue.Queue(maxsize=STREAM_QUEUE_PAGES)
+    batch_queue = queue.Queue(maxsize=STREAM_QUEUE_BATCHES)
+    stop = threading.Event()
+    errors = []
+
+    threads = [
+        threading.Thread(target=_run_stage, args=(_crawl_stage, page_queue, errors, video_id, pages, stop),
+                         name=f"crawl-{video_id}", daemon=True),
+        threading.Thread(target=_run_stage, args=(_preprocess_stage, batch_queue, errors, page_queue, stop),
+                         name=f"preprocess-{video_id}", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    analyzed = 0
+    try:
+        while (batch := batch_queue.get()) is not _STREAM_DONE:
+            with _inference_slots:
+                results = analyze_batch(batch)
+            save_sentiment(results)
+            analyzed += len(results)
+    finally:
+        # Normally both stages are done here. If a stage or the model failed,
+        # tell them to stop and keep draining so no put() stays blocked
+        # Downstream first: preprocessing exits on stop or on the crawler's
+        # _STREAM_DONE, then the crawler's page_queue can be drained freely
+        stop.set()
+        for t, out_queue in ((threads[1], batch_queue), (threads[0], page_queue)):
+            while t.is_alive():
+                try:
+                    out_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+    if errors:
+        raise errors[0]
+
+    print(f"  [{video_id}] Streamed {analyzed} comments through sentiment analysis")
+    return analyzed
 
 
 # ── Export TXT ──────────────────────────────────────────────────
 
-def export_to_txt(video: Video, all_stored: list[dict]):
+def _iter_threads(video_id: str, columns: list[str]):
+    """Stream (top-level comment, [replies]) pairs in thread order, one thread in memory at a time"""
+    top, replies = None, []
+    for c in iter_comments(video_id, columns=columns):
+        if c["parent_id"] is None:
+            if top is not None:
+                yield top, replies
+            top, replies = c, []
+        elif top is not None and c["parent_id"] == top["comment_id"]:
+            replies.append(c)
+    if top is not None:
+        yield top, replies
+
+
+def _write_header(f, video: Video, counts: dict):
+    f.write("=" * 60 + "\n")
+    f.write(f"Video Title: {video.description}\n")
+    f.write(f"Channel:     {video.author}\n")
+    f.write(f"URL:         https://youtube.com/watch?v={video.video_id}\n")
+    f.write(f"Views:       {video.view_count:,}\n")
+    f.write(f"Top-level:   {counts['top_level']} comments\n")
+    f.write(f"Replies:     {counts['replies']} comments\n")
+    f.write(f"Total:       {counts['top_level'] + counts['replies']} comments\n")
+    f.write("=" * 60 + "\n\n")
+
+
+def export_to_txt(video: Video):
     os.makedirs(COMMENTS_DIR, exist_ok=True)
     filename = os.path.join(COMMENTS_DIR, f"{video.video_id}_comments.txt")
-    top_level = [c for c in all_stored if c["parent_id"] is None]
-    replies = [c for c in all_stored if c["parent_id"] is not None]
+    columns = ["comment_id", "parent_id", "username", "text", "like_count", "created_at"]
 
     with open(filename, "w", encoding="utf-8") as f:
-        f.write("=" * 60 + "\n")
-        f.write(f"Video Title: {video.description}\n")
-        f.write(f"Channel:     {video.author}\n")
-        f.write(f"URL:         https://youtube.com/watch?v={video.video_id}\n")
-        f.write(f"Views:       {video.view_count:,}\n")
-        f.write(f"Top-level:   {len(top_level)} comments\n")
-        f.write(f"Replies:     {len(replies)} comments\n")
-        f.write(f"Total:       {len(all_stored)} comments\n")
-        f.write("=" * 60 + "\n\n")
+        _write_header(f, video, count_comments(video.video_id))
 
-        for i, c in enumerate(top_level, 1):
+        for i, (c, comment_replies) in enumerate(_iter_threads(video.video_id, columns), 1):
             f.write(f"[{i}] {c['username']}  👍{c['like_count']}  {c['created_at'][:10]}\n")
             f.write(f"{c['text']}\n")
 
-            comment_replies = [r for r in replies if r["parent_id"] == c["comment_id"]]
             for r in comment_replies:
                 f.write(f"\n    ↳ {r['username']}  👍{r['like_count']}  {r['created_at'][:10]}\n")
                 f.write(f"    {r['text']}\n")
@@ -322,25 +438,15 @@ def export_to_txt(video: Video, all_stored: list[dict]):
     print(f"  Exported to {filename}")
 
 
-def export_to_txt_v2(video: Video, all_stored: list[dict], summary: dict):
+def export_to_txt_v2(video: Video, summary: dict):
     os.makedirs(COMMENTS_DIR, exist_ok=True)
     filename = os.path.join(COMMENTS_DIR, f"{video.video_id}_comments_v2.txt")
-    top_level = [c for c in all_stored if c["parent_id"] is None]
-    replies = [c for c in all_stored if c["parent_id"] is not None]
     total = sum(summary.values())
 
     with open(filename, "w", encoding="utf-8") as f:
 
         # ── Video Info ──────────────────────────────────────
-        f.write("=" * 60 + "\n")
-        f.write(f"Video Title: {video.description}\n")
-        f.write(f"Channel:     {video.author}\n")
-        f.write(f"URL:         https://youtube.com/watch?v={video.video_id}\n")
-        f.write(f"Views:       {video.view_count:,}\n")
-        f.write(f"Top-level:   {len(top_level)} comments\n")
-        f.write(f"Replies:     {len(replies)} comments\n")
-        f.write(f"Total:       {len(all_stored)} comments\n")
-        f.write("=" * 60 + "\n\n")
+        _write_header(f, video, count_comments(video.video_id))
 
         # ── Sentiment Analysis Summary ──────────────────────────────────────
         f.write("【Sentiment Analysis Summary】\n")
@@ -351,32 +457,23 @@ def export_to_txt_v2(video: Video, all_stored: list[dict], summary: dict):
             f.write(f"Neutral:  {summary['neutral']}  ({summary['neutral'] / total * 100:.1f}%)\n")
         f.write("\n")
 
-        # Top 5 Positive
-        positives = sorted(
-            [c for c in all_stored if c.get("sentiment_label") == "positive"],
-            key=lambda x: x.get("sentiment_score", 0), reverse=True
-        )
-        f.write("Top 5 Most Positive Comments:\n")
-        for i, c in enumerate(positives[:5], 1):
-            f.write(f"  {i}. [{c['sentiment_score']:.2f}] {c['clean_text'][:80]}\n")
-        f.write("\n")
-
-        # Top 5 Negative
-        negatives = sorted(
-            [c for c in all_stored if c.get("sentiment_label") == "negative"],
-            key=lambda x: x.get("sentiment_score", 0), reverse=True
-        )
-        f.write("Top 5 Most Negative Comments:\n")
-        for i, c in enumerate(negatives[:5], 1):
-            f.write(f"  {i}. [{c['sentiment_score']:.2f}] {c['clean_text'][:80]}\n")
-        f.write("\n")
+        # Top 5 Positive / Negative, straight from the (video_id, label, score) index
+        for label, title in [("positive", "Positive"), ("negative", "Negative")]:
+            top = iter_comments(video.video_id, columns=["clean_text", "sentiment_score"],
+                                label=label, order="score", limit=5)
+            f.write(f"Top 5 Most {title} Comments:\n")
+            for i, c in enumerate(top, 1):
+                f.write(f"  {i}. [{c['sentiment_score']:.2f}] {c['clean_text'][:80]}\n")
+            f.write("\n")
         f.write("=" * 60 + "\n\n")
 
         # ── All Comments (with sentiment labels) ────────────────────────
         f.write("【All Comments】\n\n")
         LABEL_MAP = {"positive": "✅", "negative": "❌", "neutral": "➖"}
+        columns = ["comment_id", "parent_id", "username", "text", "like_count",
+                   "created_at", "sentiment_label", "sentiment_score"]
 
-        for i, c in enumerate(top_level, 1):
+        for i, (c, comment_replies) in enumerate(_iter_threads(video.video_id, columns), 1):
             label = c.get("sentiment_label", "")
             score = c.get("sentiment_score", 0)
             icon = LABEL_MAP.get(label, "")
@@ -385,13 +482,11 @@ def export_to_txt_v2(video: Video, all_stored: list[dict], summary: dict):
                     f"👍{c['like_count']}  {c['created_at'][:10]}\n")
             f.write(f"Original: {c['text']}\n")
 
-            # Only show sentiment if analyzed
-            if label:
+            # Only show sentiment if analyzed (not filtered out by preprocessing)
+            if label and label != SKIPPED_LABEL:
                 f.write(f"Sentiment: {label} (confidence {score:.2f})\n")
 
             # Replies
-            comment_replies = [r for r in replies
-                               if r["parent_id"] == c["comment_id"]]
             for r in comment_replies:
                 r_label = r.get("sentiment_label", "")
                 r_score = r.get("sentiment_score", 0)
@@ -399,7 +494,7 @@ def export_to_txt_v2(video: Video, all_stored: list[dict], summary: dict):
                 f.write(f"\n    ↳ {r_icon} {r['username']}  "
                         f"👍{r['like_count']}  {r['created_at'][:10]}\n")
                 f.write(f"    Original: {r['text']}\n")
-                if r_label:
+                if r_label and r_label != SKIPPED_LABEL:
                     f.write(f"    Sentiment: {r_label} (confidence {r_score:.2f})\n")
 
             f.write("\n" + "-" * 60 + "\n\n")
@@ -407,33 +502,110 @@ def export_to_txt_v2(video: Video, all_stored: list[dict], summary: dict):
     print(f"  Exported to {filename}")
 
 
-def export_clean_json(video_id: str, analyzed: list[dict]):
+# Only keep meaningful fields
+CLEAN_EXPORT_FIELDS = [
+    "comment_id", "video_id", "parent_id", "username", "clean_text", "like_count",
+    "reply_count", "created_at", "sentiment_label", "sentiment_score",
+]
+
+
+def export_clean_json(video_id: str):
+    """Analyzed comments as a JSON array, written one element at a time"""
     os.makedirs(COMMENTS_DIR, exist_ok=True)
     filename = os.path.join(COMMENTS_DIR, f"{video_id}_clean.txt")
 
-    # Only keep meaningful fields
-    clean_data = [
-        {
-            "comment_id": c["comment_id"],
-            "video_id": c["video_id"],
-            "parent_id": c["parent_id"],
-            "username": c["username"],
-            "clean_text": c["clean_text"],
-            "like_count": c["like_count"],
-            "reply_count": c["reply_count"],
-            "created_at": c["created_at"],
-            "sentiment_label": c["sentiment_label"],
-            "sentiment_score": c["sentiment_score"],
-        }
-        for c in analyzed
-    ]
-
     with open(filename, "w", encoding="utf-8") as f:
-        json.dump(clean_data, f, indent=2, ensure_ascii=False)
+        # Same layout as json.dump(list, indent=2)
+        f.write("[")
+        first = True
+        for c in iter_comments(video_id, columns=CLEAN_EXPORT_FIELDS):
+            if c["sentiment_label"] in (None, SKIPPED_LABEL):
+                continue
+            item = json.dumps(c, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            f.write(("\n  " if first else ",\n  ") + item)
+            first = False
+        f.write("]" if first else "\n]")
 
     print(f"  Exported to {filename}")
 
 
+# ── Per-video Pipeline ──────────────────────────────────────────────────
+
+def process_video(video: Video, product_name: str) -> dict:
+    """
+    Full pipeline for one video: transcript + comments → sentiment → Gemini analysis.
+    Several videos run this concurrently; each stage holds a slot of its own
+    semaphore (network / inference / Gemini) so no stage is oversubscribed.
+    Returns: {"video", "summary", "analysis"}; analysis is None if Gemini failed
+    """
+    tag = f"[{video.video_id}]"
+    save_video(video)
+
+    with _network_slots:
+        print(f"\n{tag} Fetching transcript...")
+        transcript_result = get_transcript(video.video_id)
+    if transcript_result["success"]:
+        print(f"{tag} ✓ Got transcript ({transcript_result['language']})")
+        export_transcript(video.video_id, transcript_result)
+    else:
+        print(f"{tag} ⚠️  {transcript_result['error']}")
+
+    # Sentiment runs on each page while the rest of the crawl is in flight;
+    # the crawl thread takes a network slot, each model call an inference slot
+    print(f"{tag} Fetching comments and analyzing sentiment (streaming)...")
+    analyze_comment_stream(video.video_id, stream_new_comments(video.video_id))
+
+    summary = get_sentiment_summary(video.video_id)
+    export_to_txt(video)
+    export_to_txt_v2(video, summary)
+    export_clean_json(video.video_id)
+
+    with _gemini_slots:
+        print(f"{tag} Running Gemini analysis...")
+        analysis = generate_full_analysis(
+            video_id=video.video_id,
+            product_name=product_name,
+            directory=COMMENTS_DIR
+        )
+    if analysis:
+        export_analysis_json(video.video_id, analysis, directory=COMMENTS_DIR)
+
+    return {"video": video, "summary": summary, "analysis": analysis}
+
+
+def analyze_videos(videos: list[Video], product_name: str) -> list[dict]:
+    """
+    Run process_video for all videos concurrently.
+    Returns results in the same order as `videos`; a video that raised gets None.
+    QuotaExceededError is not swallowed: queued videos are cancelled and it is
+    re-raised once the running ones finish, so callers can answer with a 429.
+    """
+    if not videos:
+        return []
+
+    quota_error = None
+    workers = min(len(videos), VIDEO_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="video") as pool:
+        futures = [pool.submit(process_video, video, product_name) for video in videos]
+        for future in as_completed(futures):
+            if isinstance(future.exception(), QuotaExceededError):
+                quota_error = future.exception()
+                for f in futures:
+                    f.cancel()
+                break
+    if quota_error is not None:
+        raise quota_error
+
+    results = []
+    for video, future in zip(videos, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            print(f"\n[{video.video_id}] ❌ Pipeline failed: {e}")
+            results.append(None)
+    return results
+
+
 # ── Main Flow ────────────────────────────────────────────────────
 
 def run():
@@ -466,149 +638,67 @@ def run():
         print(f"   https://youtube.com/watch?v={v.video_id}")
     print("-" * 60)
 
-    # confirm = input(f"\nScrape comments from these {len(videos)} video(s)? (y/n): ").strip().lower()
-    # if confirm != "y":
-    #     print("Cancelled")
-    #     return
-
-    # Step 3: Fetch comments + analyze + export
-    for i, video in enumerate(videos, 1):
-        print(f"\n[{i}/{len(videos)}] Fetching video info...")
-        print(f"  Title:    {video.description}")
-        print(f"  Channel:  {video.author}")
-        print(f"  Views:    {video.view_count:,}")
-        print(f"  Comments: {video.comment_count:,}")
-        save_video(video)
-
-        # Fetch transcript
-        print(f"\n[Transcript] Fetching video transcript...")
-        transcript_result = fetch_transcript_auto(video.video_id, debug=True)
+    # Step 3: Fetch comments + analyze + export, all videos in parallel
+    print(f"\nProcessing {len(videos)} video(s) concurrently...")
+    results = analyze_videos(videos, product_name)
 
-        if transcript_result["success"]:
-            print(f"  ✓ Got transcript ({transcript_result['language']})")
-            export_transcript(video.video_id, transcript_result)
-        else:
-            print(f"  ⚠️  {transcript_result['error']}")
-            print(f"     Video may not have captions/subtitles available")
-
-        print(f"\nFetching comments and replies...")
-        comments = fetch_all_comments(video.video_id)
-        save_comments(comments)
-
-        all_stored = get_all_comments(video.video_id)
-        top_level = [c for c in all_stored if c["parent_id"] is None]
-        replies = [c for c in all_stored if c["parent_id"] is not None]
+    for i, result in enumerate(results, 1):
+        if result is None:
+            continue
+        video = result["video"]
+        summary = result["summary"]
+        total = sum(summary.values())
 
         print(f"\n{'=' * 50}")
-        print(f"Scraping complete!")
-        print(f"  Top-level: {len(top_level)} comments")
-        print(f"  Replies:   {len(replies)} comments")
-        print(f"  Total:     {len(all_stored)} comments")
-        print(f"{'=' * 50}")
-
-        # Preview first 3 comments
-        print("\nFirst 3 comments preview (with replies):")
-        count = 0
-        for c in all_stored:
-            if c["parent_id"] is not None:
-                continue
-            print(f"\n💬 {c['username']}  👍{c['like_count']}")
-            print(f"   {c['text'][:80]}{'...' if len(c['text']) > 80 else ''}")
-            comment_replies = [r for r in all_stored if r["parent_id"] == c["comment_id"]]
-            for r in comment_replies[:2]:
-                print(f"   └─ {r['username']}: {r['text'][:60]}{'...' if len(r['text']) > 60 else ''}")
-            if len(comment_replies) > 2:
-                print(f"   └─ ... {len(comment_replies) - 2} more replies")
-            count += 1
-            if count >= 3:
-                break
-
-        print("\nExporting txt file...")
-        export_to_txt(video, all_stored)
-
-        all_stored = get_all_comments(video.video_id)
-
-        cleaned = preprocess_comments(all_stored)
-        analyzed = analyze_batch(cleaned)
-        save_sentiment(analyzed)
-
-        # Summary output
-        summary = get_sentiment_summary(video.video_id)
-        all_stored = get_all_comments(video.video_id)
-        export_to_txt_v2(video, all_stored, summary)
-        export_clean_json(video.video_id, analyzed)
-        total = sum(summary.values())
-        print(f"\nSentiment Analysis Results:")
-        print(f"  Positive: {summary['positive']} ({summary['positive'] / total * 100:.1f}%)")
-        print(f"  Negative: {summary['negative']} ({summary['negative'] / total * 100:.1f}%)")
-        print(f"  Neutral:  {summary['neutral']}  ({summary['neutral'] / total * 100:.1f}%)")
+        print(f"[{i}/{len(videos)}] {video.description}")
+        print(f"  Channel:  {video.author}")
+        print(f"  Views:    {video.view_count:,}")
+        if total > 0:
+            print(f"\nSentiment Analysis Results:")
+            print(f"  Positive: {summary['positive']} ({summary['positive'] / total * 100:.1f}%)")
+            print(f"  Negative: {summary['negative']} ({summary['negative'] / total * 100:.1f}%)")
+            print(f"  Neutral:  {summary['neutral']}  ({summary['neutral'] / total * 100:.1f}%)")
 
         # Print top 3 most positive / negative
-        positives = get_comments_by_sentiment(video.video_id, "positive")
-        negatives = get_comments_by_sentiment(video.video_id, "negative")
-
-        print("\nTop 3 Most Positive Comments:")
-        for r in positives[:3]:
-            print(f"  [{r['sentiment_score']:.2f}] {r['clean_text'][:70]}")
-
-        print("\nTop 3 Most Negative Comments:")
-        for r in negatives[:3]:
-            print(f"  [{r['sentiment_score']:.2f}] {r['clean_text'][:70]}")
-
-        print(f"\n[Transcript] Fetching video transcript...")
-        transcript_result = fetch_transcript_auto(video.video_id)
-
-        if transcript_result["success"]:
-            print(f"  ✓ Got transcript ({transcript_result['language']})")
-            export_transcript(video.video_id, transcript_result)
-        else:
-            print(f"  ⚠️  {transcript_result['error']}")
-            print(f"     Video may not have captions/subtitles available")
-            continue
-
-        print(f"\nFetching comments and replies...")
-
-        # ─────────────────────────────────────────────────
-        # 新增：Gemini 完整分析
-        # ─────────────────────────────────────────────────
+        for label, title in [("positive", "Positive"), ("negative", "Negative")]:
+            print(f"\nTop 3 Most {title} Comments:")
+            for r in iter_comments(video.video_id, columns=["clean_text", "sentiment_score"],
+                                   label=label, order="score", limit=3):
+                print(f"  [{r['sentiment_score']:.2f}] {r['clean_text'][:70]}")
+
+        if not result["analysis"]:
+            print("\n⚠️  Gemini analysis failed for this video, but other exports are complete.")
+
+    # ─────────────────────────────────────────────────
+    # Gemini 分析结果合并为一个商品结论
+    # ─────────────────────────────────────────────────
+    analysis_result = merge_analysis_results(
+        product_name, [r["analysis"] for r in results if r]
+    )
 
+    if analysis_result:
+        # 打印摘要
         print("\n" + "=" * 60)
-        print("Starting Gemini AI Analysis...")
+        print("FINAL ANALYSIS SUMMARY")
         print("=" * 60)
-
-        # 使用保存的商品名
-        analysis_result = generate_full_analysis(
-            video_id=video.video_id,
-            product_name=product_name,  # ← 使用搜索时输入的商品名
-            directory="comments"
-        )
-
-        if analysis_result:
-            # 导出分析结果
-            export_analysis_json(video.video_id, analysis_result, directory="comments")
-
-            # 打印摘要
-            print("\n" + "=" * 60)
-            print("FINAL ANALYSIS SUMMARY")
-            print("=" * 60)
-            print(f"Product: {analysis_result['product']}")
-            print(f"Verdict: {analysis_result['recommendation']['verdict']}")
-            print(f"Confidence: {analysis_result['confidence']}%")
-            print(f"Value Score: {analysis_result['value']['score']}/100")
-            print(f"\nSentiment Breakdown:")
-            print(f"  Positive: {analysis_result['sentiment']['positive']}%")
-            print(f"  Neutral:  {analysis_result['sentiment']['neutral']}%")
-            print(f"  Negative: {analysis_result['sentiment']['negative']}%")
-            print(f"\nTotal Reviews Analyzed: {analysis_result['totalReviews']}")
-            print(f"\nPros ({len(analysis_result['pros'])}):")
-            for pro in analysis_result['pros'][:3]:
-                print(f"  ✓ {pro}")
-            print(f"\nCons ({len(analysis_result['cons'])}):")
-            for con in analysis_result['cons'][:3]:
-                print(f"  ✗ {con}")
-            print("=" * 60 + "\n")
-        else:
-            print("\n⚠️  Gemini analysis failed, but other exports are complete.\n")
+        print(f"Product: {analysis_result['product']}")
+        print(f"Verdict: {analysis_result['recommendation']['verdict']}")
+        print(f"Confidence: {analysis_result['confidence']}%")
+        print(f"Value Score: {analysis_result['value']['score']}/100")
+        print(f"\nSentiment Breakdown:")
+        print(f"  Positive: {analysis_result['sentiment']['positive']}%")
+        print(f"  Neutral:  {analysis_result['sentiment']['neutral']}%")
+        print(f"  Negative: {analysis_result['sentiment']['negative']}%")
+        print(f"\nTotal Reviews Analyzed: {analysis_result['totalReviews']}")
+        print(f"\nPros ({len(analysis_result['pros'])}):")
+        for pro in analysis_result['pros'][:3]:
+            print(f"  ✓ {pro}")
+        print(f"\nCons ({len(analysis_result['cons'])}):")
+        for con in analysis_result['cons'][:3]:
+            print(f"  ✗ {con}")
+        print("=" * 60 + "\n")
+    else:
+        print("\n⚠️  Gemini analysis failed, but other exports are complete.\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,328 @@
+# mock_youtube_server.py
+"""
+Local stand-in for the YouTube Data API v3 (search, videos, commentThreads,
+comments) for load / throughput testing without spending real quota.
+
+Seeded from the exported comments/*_clean.txt files and/or synthetic videos.
+Supports pageToken pagination, embedded replies (first 5) + totalReplyCount,
+configurable latency and error injection (5xx / 429 / 403 quotaExceeded).
+
+Run the server, then point the crawler at it with a throwaway database (the
+HTTP cache is kept apart automatically for a non-default API base):
+    python mock_youtube_server.py --synthetic 3 --threads 2000 --latency-ms 80 --error-rate 0.02
+    AAI_DB_PATH=/tmp/aai_mock.db YOUTUBE_API_BASE=http://127.0.0.1:8765/youtube/v3 python main.py
+
+Or measure crawl throughput at several concurrency levels in one go:
+    python mock_youtube_server.py --synthetic 2 --bench --concurrency 1,4,8,16
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import Flask, request, jsonify
+
+HOST = "127.0.0.1"
+PORT = 8765
+EMBEDDED_REPLIES = 5        # commentThreads embeds at most 5 replies, like the real API
+DEFAULT_MAX_RESULTS = 20
+
+
+# ── Seed Data ──────────────────────────────────────────────────
+
+class MockStore:
+    def __init__(self):
+        # video_id -> {"meta": {...}, "threads": [comment], "replies": {parent_id: [comment]}}
+        self.videos = {}
+        self.parents = {}   # thread id -> video_id, for comments.list?parentId=
+
+    def _video(self, video_id: str, title: str, channel: str) -> dict:
+        return self.videos.setdefault(video_id, {
+            "meta": {"title": title, "channel": channel, "views": 0, "likes": 0},
+            "threads": [],
+            "replies": {},
+        })
+
+    def load_clean_files(self, pattern: str) -> int:
+        """Load exported {video_id}_clean.txt files; replies whose parent was filtered out are dropped"""
+        loaded = 0
+        for path in glob.glob(pattern):
+            with open(path, encoding="utf-8") as f:
+                rows = json.load(f)
+            if not rows:
+                continue
+            video_id = rows[0]["video_id"]
+            video = self._video(video_id, f"Review video {video_id}", "Seeded Channel")
+            top_ids = {r["comment_id"] for r in rows if r["parent_id"] is None}
+            for r in rows:
+                comment = {
+                    "id": r["comment_id"],
+                    "author": r.get("username", ""),
+                    "text": r.get("clean_text", ""),
+                    "like_count": r.get("like_count", 0),
+                    "published_at": r.get("created_at", ""),
+                }
+                if r["parent_id"] is None:
+                    video["threads"].append(comment)
+                    self.parents[r["comment_id"]] = video_id
+                elif r["parent_id"] in top_ids:
+                    video["replies"].setdefault(r["parent_id"], []).append(comment)
+            loaded += 1
+        return loaded
+
+    def add_synthetic(self, n_videos: int, threads: int, max_replies: int, seed: int = 0):
+        rng = random.Random(seed)
+        words = ["battery", "keyboard", "screen", "price", "speakers", "fast", "slow",
+                 "love", "hate", "worth", "great", "bad", "camera", "build", "quality"]
+        for v in range(n_videos):
+            video_id = f"synth{v:06d}"
+            video = self._video(video_id, f"Synthetic review {v}", f"Channel {v % 7}")
+            video["meta"].update(views=rng.randint(10_000, 5_000_000), likes=rng.randint(100, 50_000))
+            for t in range(threads):
+                thread_id = f"{video_id}T{t:07d}"
+                self.parents[thread_id] = video_id
+                video["threads"].append({
+                    "id": thread_id,
+                    "author": f"@user{rng.randint(0, 99999)}",
+                    "text": " ".join(rng.choices(words, k=rng.randint(4, 30))),
+                    "like_count": int(rng.paretovariate(1.2)) - 1,
+                    "published_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T"
+                                    f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+                })
+                n_replies = min(max_replies, int(rng.paretovariate(0.9)) - 1)
+                video["replies"][thread_id] = [{
+                    "id": f"{thread_id}.R{r:05d}",
+                    "author": f"@user{rng.randint(0, 99999)}",
+                    "text": " ".join(rng.choices(words, k=rng.randint(2, 15))),
+                    "like_count": rng.randint(0, 5),
+                    "published_at": "2024-12-31T00:00:00Z",
+                } for r in range(n_replies)]
+
+
+# ── API Server ──────────────────────────────────────────────────
+
+def _comment_resource(c: dict, video_id: str, parent_id: str = None) -> dict:
+    snippet = {
+        "videoId": video_id,
+        "authorDisplayName": c["author"],
+        "textOriginal": c["text"],
+        "textDisplay": c["text"],
+        "likeCount": c["like_count"],
+        "publishedAt": c["published_at"],
+        "updatedAt": c["published_at"],
+    }
+    if parent_id:
+        snippet["parentId"] = parent_id
+    return {"kind": "youtube#comment", "id": c["id"], "snippet": snippet}
+
+
+def _paginate(items: list, max_default: int = DEFAULT_MAX_RESULTS) -> tuple[dict, list]:
+    max_results = min(int(request.args.get("maxResults", max_default)), 100)
+    offset = int(request.args.get("pageToken", "0") or 0)
+    page = items[offset:offset + max_results]
+    body = {"pageInfo": {"totalResults": len(items), "resultsPerPage": max_results}}
+    if offset + max_results < len(items):
+        body["nextPageToken"] = str(offset + max_results)
+    return body, page
+
+
+def _error(code: int, reason: str, message: str):
+    return jsonify({"error": {"code": code, "message": message,
+                              "errors": [{"reason": reason, "message": message}]}}), code
+
+
+def create_app(store: MockStore, latency_ms: float = 0, jitter_ms: float = 0,
+               error_rate: float = 0.0, quota_error_rate: float = 0.0) -> Flask:
+    app = Flask(__name__)
+    stats = Counter()
+    stats_lock = threading.Lock()
+    app.config["MOCK_STATS"] = stats
+
+    @app.before_request
+    def inject():
+        endpoint = request.path.rsplit("/", 1)[-1]
+        with stats_lock:
+            stats[endpoint] += 1
+        if latency_ms or jitter_ms:
+            time.sleep((latency_ms + random.uniform(0, jitter_ms)) / 1000)
+        if endpoint == "stats":
+            return None
+        roll = random.random()
+        if roll < quota_error_rate:
+            with stats_lock:
+                stats["errors_403"] += 1
+            return _error(403, "quotaExceeded", "The request cannot be completed because you have exceeded your quota.")
+        if roll < quota_error_rate + error_rate:
+            code = random.choice([429, 500, 503])
+            with stats_lock:
+                stats[f"errors_{code}"] += 1
+            reason = "rateLimitExceeded" if code == 429 else "backendError"
+            return _error(code, reason, "Injected error")
+        return None
+
+    @app.route("/youtube/v3/search")
+    def search():
+        video_ids = list(store.videos)
+        body, page = _paginate(video_ids, max_default=5)
+        body["items"] = [{
+            "kind": "youtube#searchResult",
+            "id": {"kind": "youtube#video", "videoId": v},
+            "snippet": {"title": store.videos[v]["meta"]["title"],
+                        "channelTitle": store.videos[v]["meta"]["channel"]},
+        } for v in page]
+        return jsonify(body)
+
+    @app.route("/youtube/v3/videos")
+    def videos():
+        items = []
+        for video_id in request.args.get("id", "").split(","):
+            video = store.videos.get(video_id)
+            if video is None:
+                continue
+            n_comments = len(video["threads"]) + sum(len(r) for r in video["replies"].values())
+            items.append({
+                "kind": "youtube#video",
+                "id": video_id,
+                "snippet": {"title": video["meta"]["title"], "channelTitle": video["meta"]["channel"]},
+                "statistics": {"viewCount": str(video["meta"]["views"]),
+                               "likeCount": str(video["meta"]["likes"]),
+                               "commentCount": str(n_comments)},
+            })
+        etag = f'"{hash(json.dumps(items, sort_keys=True)) & 0xffffffff:x}"'
+        if request.headers.get("If-None-Match") == etag:
+            return "", 304
+        resp = jsonify({"etag": etag, "items": items})
+        resp.headers["ETag"] = etag
+        return resp
+
+    @app.route("/youtube/v3/commentThreads")
+    def comment_threads():
+        video_id = request.args.get("videoId", "")
+        video = store.videos.get(video_id)
+        if video is None:
+            return _error(404, "videoNotFound", f"Video {video_id} not found")
+
+        if request.args.get("order", "time") == "relevance":
+            threads = sorted(video["threads"], key=lambda c: c["like_count"], reverse=True)
+        else:
+            threads = sorted(video["threads"], key=lambda c: c["published_at"], reverse=True)
+
+        with_replies = "replies" in request.args.get("part", "")
+        body, page = _paginate(threads)
+        items = []
+        for c in page:
+            replies = video["replies"].get(c["id"], [])
+            item = {
+                "kind": "youtube#commentThread",
+                "id": c["id"],
+                "snippet": {
+                    "videoId": video_id,
+                    "topLevelComment": _comment_resource(c, video_id),
+                    "totalReplyCount": len(replies),
+                },
+            }
+            if with_replies and replies:
+                item["replies"] = {"comments": [
+                    _comment_resource(r, video_id, c["id"]) for r in replies[:EMBEDDED_REPLIES]
+                ]}
+            items.append(item)
+        body["items"] = items
+        return jsonify(body)
+
+    @app.route("/youtube/v3/comments")
+    def comments():
+        parent_id = request.args.get("parentId", "")
+        video_id = store.parents.get(parent_id, "")
+        replies = store.videos.get(video_id, {}).get("replies", {}).get(parent_id, [])
+        body, page = _paginate(replies)
+        body["items"] = [_comment_resource(r, video_id, parent_id) for r in page]
+        return jsonify(body)
+
+    @app.route("/youtube/v3/stats")
+    def get_stats():
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    return app
+
+
+# ── Throughput Benchmark ──────────────────────────────────────────────────
+
+def run_bench(app: Flask, store: MockStore, concurrency_levels: list[int], max_pages: int,
+              port: int = PORT):
+    """Crawl every seeded video at each concurrency level and report throughput"""
+    import tempfile
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(HOST, port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["YOUTUBE_API_BASE"] = f"http://{HOST}:{port}/youtube/v3"
+
+    # Imported only now so http_client picks up the mock base URL
+    from scraper import response_cache
+    from scraper.comment_fetcher import AsyncCommentFetcher
+    from scraper.http_client import run_async
+
+    response_cache.CACHE_DIR = tempfile.mkdtemp(prefix="mock_yt_cache_")
+    stats = app.config["MOCK_STATS"]
+
+    print(f"{'concurrency':>11} {'comments':>9} {'requests':>9} {'seconds':>8} {'comments/s':>11} {'req/s':>7}")
+    for concurrency in concurrency_levels:
+        stats.clear()
+        start = time.perf_counter()
+        total = 0
+        for video_id in store.videos:
+            fetcher = AsyncCommentFetcher(concurrency=concurrency)
+            total += len(run_async(fetcher.fetch_all(video_id, max_pages)))
+        elapsed = time.perf_counter() - start
+        n_requests = stats["commentThreads"] + stats["comments"]
+        print(f"{concurrency:>11} {total:>9} {n_requests:>9} {elapsed:>8.2f} "
+              f"{total / elapsed:>11.1f} {n_requests / elapsed:>7.1f}")
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock YouTube Data API v3 server")
+    parser.add_argument("--seed-files", default=os.path.join("comments", "*_clean.txt"),
+                        help="glob of exported *_clean.txt files to serve ('' to disable)")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of synthetic videos")
+    parser.add_argument("--threads", type=int, default=1000, help="top-level threads per synthetic video")
+    parser.add_argument("--max-replies", type=int, default=300, help="max replies per synthetic thread")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 429/500/503 responses")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="fraction of 403 quotaExceeded")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--bench", action="store_true", help="run a crawl throughput benchmark and exit")
+    parser.add_argument("--concurrency", default="1,4,8,16", help="bench concurrency levels")
+    parser.add_argument("--max-pages", type=int, default=3, help="bench pages per order")
+    args = parser.parse_args()
+
+    store = MockStore()
+    if args.seed_files:
+        print(f"[MockYouTube] Loaded {store.load_clean_files(args.seed_files)} seeded videos")
+    if args.synthetic:
+        store.add_synthetic(args.synthetic, args.threads, args.max_replies)
+        print(f"[MockYouTube] Generated {args.synthetic} synthetic videos")
+
+    app = create_app(store, args.latency_ms, args.jitter_ms, args.error_rate, args.quota_error_rate)
+
+    if args.bench:
+        run_bench(app, store, [int(c) for c in args.concurrency.split(",")], args.max_pages, args.port)
+        return
+
+    print(f"[MockYouTube] Serving on http://{HOST}:{args.port}/youtube/v3")
+    app.run(host=HOST, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
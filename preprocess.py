@@ -39,6 +39,17 @@ def is_valid(text: str) -> bool:
     return True
 
 
+def preprocess_comment(comment: dict) -> dict | None:
+    """Single-comment version of preprocess_comments; None if filtered out"""
+    clean = normalize(comment.get("text") or "")
+    if not is_valid(clean):
+        return None
+    return {
+        **comment,
+        "clean_text": clean,   # Cleaned text for Agent to use
+    }
+
+
 def preprocess_comments(comments: list[dict]) -> list[dict]:
     """
     Input: Raw comment list from database get_all_comments()
@@ -48,17 +59,11 @@ def preprocess_comments(comments: list[dict]) -> list[dict]:
     skipped = 0
 
     for c in comments:
-        raw_text = c.get("text", "")
-        clean = normalize(raw_text)
-
-        if not is_valid(clean):
+        cleaned = preprocess_comment(c)
+        if cleaned is None:
             skipped += 1
             continue
-
-        results.append({
-            **c,
-            "clean_text": clean,   # Cleaned text for Agent to use
-        })
+        results.append(cleaned)
 
     print(f"[Preprocess] Original: {len(comments)} → Valid: {len(results)} (filtered {skipped})")
     return results
\ No newline at end of file
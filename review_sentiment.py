@@ -0,0 +1,36 @@
+"""
+Sentiment pass for stored TikTok Shop reviews.
+
+Used by both main.py and the scheduler, so the scheduler does not have to
+import the CLI / YouTube pipeline just to analyze reviews.
+"""
+from preprocess import preprocess_comment
+from sentiment import analyze_batch, inference_slots, SENTIMENT_BATCH_SIZE
+from storage.database import iter_unanalyzed_reviews, save_review_sentiment, mark_reviews_skipped
+
+
+def analyze_product_reviews(product_id: str) -> int:
+    """
+    Run stored-but-unanalyzed TikTok reviews of one product through the same
+    preprocess → sentiment path as YouTube comments. Returns the number analyzed.
+    """
+    analyzed = 0
+    for chunk in iter_unanalyzed_reviews(product_id):
+        batch, skipped = [], []
+        for r in chunk:
+            cleaned = preprocess_comment(r)
+            if cleaned is not None:
+                batch.append(cleaned)
+            else:
+                skipped.append(r["review_id"])
+        # Too short / spam / rating-only: marked so they leave the unanalyzed queue
+        if skipped:
+            mark_reviews_skipped(skipped)
+        for i in range(0, len(batch), SENTIMENT_BATCH_SIZE):
+            with inference_slots:
+                results = analyze_batch(batch[i:i + SENTIMENT_BATCH_SIZE])
+            save_review_sentiment(results)
+            analyzed += len(results)
+
+    print(f"  [{product_id}] Analyzed sentiment for {analyzed} reviews")
+    return analyzed
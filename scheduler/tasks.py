@@ -1,29 +1,99 @@
+import threading
+import zlib
+from datetime import datetime, timedelta
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
-from scraper.browser import BrowserManager
+from scraper.cookie_manager import get_cookies
 from scraper.reviews import ReviewScraper
-from storage.database import save_reviews
-from config import FETCH_INTERVAL_MINUTES, HEADLESS
+from storage.database import save_reviews, get_known_review_ids, get_watched_products, mark_product_run
+from config import FETCH_INTERVAL_MINUTES
+from review_sentiment import analyze_product_reviews
+
+MAX_WORKERS = 4             # 同时在跑的抓取任务上限，其余排队
+JITTER_SECONDS = 60         # 每次触发额外加的随机抖动
+SYNC_INTERVAL_MINUTES = 5   # 多久从 DB 同步一次监控列表
+
+# 正在抓取的商品，上一轮没跑完的直接跳过
+_in_flight = set()
+_in_flight_lock = threading.Lock()
 
-# 监控中的商品列表（可以持久化到 DB）
-WATCHED_PRODUCTS = []
 
 def scrape_job(product_id: str):
-    print(f"[Scheduler] 开始抓取 product_id={product_id}")
-    with BrowserManager(headless=HEADLESS) as bm:
-        scraper = ReviewScraper(bm)
-        reviews = scraper.fetch_reviews(product_id)
-        save_reviews(product_id, reviews)
-    print(f"[Scheduler] 完成，共抓取 {len(reviews)} 条评论")
+    with _in_flight_lock:
+        if product_id in _in_flight:
+            print(f"[Scheduler] product_id={product_id} 上一轮还没结束，跳过")
+            return
+        _in_flight.add(product_id)
 
-def start_scheduler():
-    scheduler = BackgroundScheduler()
-    for product_id in WATCHED_PRODUCTS:
+    try:
+        # 评论接口只需要登录态 cookies，不再每次调度都启动一遍浏览器
+        # 需要浏览器的商品查询走 scraper.browser.get_browser_pool() 的常驻实例
+        # 只抓上次之后的新评论，翻到已存储的 review_id 就停
+        print(f"[Scheduler] 开始抓取 product_id={product_id}")
+        known_ids = get_known_review_ids(product_id)
+        with ReviewScraper(get_cookies()) as scraper:
+            reviews = scraper.fetch_new_reviews(product_id, known_ids)
+        saved = save_reviews(product_id, reviews)
+        # 新评论走和 YouTube 评论相同的 preprocess → 情感分析流程
+        analyze_product_reviews(product_id)
+        mark_product_run(product_id, "ok")
+        print(f"[Scheduler] 完成，新增 {saved} 条评论")
+    except Exception as e:
+        mark_product_run(product_id, f"error: {e}")
+        print(f"[Scheduler] product_id={product_id} 抓取失败: {e}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(product_id)
+
+
+def _first_run(product_id: str) -> datetime:
+    """按 product_id 把首次运行均匀错开到一个周期内，避免所有商品同时触发"""
+    offset = zlib.crc32(product_id.encode("utf-8")) % (FETCH_INTERVAL_MINUTES * 60)
+    return datetime.now() + timedelta(seconds=offset)
+
+
+def sync_watched_products(scheduler: BackgroundScheduler):
+    """让调度任务与 watched_products 表保持一致：新增的加任务，删除的撤任务"""
+    watched = set(get_watched_products())
+    scheduled = {
+        job.id.removeprefix("scrape_") for job in scheduler.get_jobs()
+        if job.id.startswith("scrape_")
+    }
+
+    for product_id in watched - scheduled:
         scheduler.add_job(
             scrape_job,
             "interval",
             minutes=FETCH_INTERVAL_MINUTES,
+            jitter=JITTER_SECONDS,
+            next_run_time=_first_run(product_id),
             args=[product_id],
-            id=f"scrape_{product_id}"
+            id=f"scrape_{product_id}",
         )
+    for product_id in scheduled - watched:
+        scheduler.remove_job(f"scrape_{product_id}")
+
+    if watched != scheduled:
+        print(f"[Scheduler] 监控商品 {len(watched)} 个"
+              f"（+{len(watched - scheduled)} / -{len(scheduled - watched)}）")
+
+
+def start_scheduler():
+    scheduler = BackgroundScheduler(
+        executors={"default": ThreadPoolExecutor(MAX_WORKERS)},
+        job_defaults={
+            "coalesce": True,           # 错过的多次触发只补跑一次
+            "max_instances": 1,
+            "misfire_grace_time": FETCH_INTERVAL_MINUTES * 60,
+        },
+    )
     scheduler.start()
-    return scheduler
\ No newline at end of file
+    sync_watched_products(scheduler)
+    scheduler.add_job(
+        sync_watched_products,
+        "interval",
+        minutes=SYNC_INTERVAL_MINUTES,
+        args=[scheduler],
+        id="sync_watched_products",
+    )
+    return scheduler
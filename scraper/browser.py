@@ -1,3 +1,10 @@
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
 from playwright.sync_api import sync_playwright
 
 class BrowserManager:
@@ -26,4 +33,226 @@ class BrowserManager:
 
     def __exit__(self, *args):
         self._browser.close()
-        self._playwright.stop()
\ No newline at end of file
+        self._playwright.stop()
+
+
+# ── 常驻浏览器 + 预热 context 池 ──────────────────────────────────────────────────
+
+POOL_SIZE = 2               # 池线程数 = 可同时进行的浏览器查询数，每个线程一个浏览器 + 一个预热 context
+MAX_USES_PER_CONTEXT = 50   # context 用过这么多次后关闭重建，防止内存/状态累积
+WARM_URL = "https://www.tiktok.com/"
+
+
+@dataclass
+class PooledContext:
+    context: Any
+    page: Any
+    uses: int = 0
+    broken: bool = field(default=False, repr=False)
+
+
+class _Worker:
+    """一个池线程自己的 Playwright 实例、浏览器和预热好的 context，只在该线程里使用"""
+
+    def __init__(self, headless: bool):
+        self.manager = BrowserManager(headless=headless)
+        self.started = False
+        self.pooled: PooledContext | None = None
+
+
+class BrowserPool:
+    """
+    size 个常驻池线程，每个线程启动自己的 Chromium 并保留一个已打开页面的 context，借出即用。
+
+    Playwright 的 sync API 绑定在启动它的线程上，所以每个浏览器和 context 都只在
+    创建它的池线程里使用：其他线程通过 run(fn, ...) 把工作放进共享队列，空闲的池线程
+    取走执行，fn 收到该线程的 PooledContext。最多 size 个查询同时进行。
+    lease() 只能在池线程内（即 fn 里）调用。
+
+    用法:
+        pool = get_browser_pool()
+        title = pool.run(lambda lease: lease.page.goto(url) and lease.page.title())
+    """
+
+    def __init__(self, size: int = POOL_SIZE, headless: bool = True,
+                 max_uses: int = MAX_USES_PER_CONTEXT, warm_url: str | None = WARM_URL):
+        self.size = size
+        self.headless = headless
+        self.max_uses = max_uses
+        self.warm_url = warm_url
+        self._jobs = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._local = threading.local()
+
+    # ── 线程调度 ──────────────────────────────────────────────────
+
+    def _worker(self) -> _Worker | None:
+        return getattr(self._local, "worker", None)
+
+    def _call(self, fn, *args, **kwargs):
+        if self._worker() is not None:
+            return fn(*args, **kwargs)
+        if not self._threads:
+            raise RuntimeError("BrowserPool 未启动或已关闭")
+        future = Future()
+        self._jobs.put((future, fn, args, kwargs))
+        return future.result()
+
+    def run(self, fn, *args, **kwargs):
+        """由一个空闲的池线程借出它的 context 执行 fn(lease, *args, **kwargs)，返回其结果"""
+        def leased():
+            with self.lease() as lease:
+                return fn(lease, *args, **kwargs)
+        return self._call(leased)
+
+    def _serve(self, ready: Future):
+        worker = self._local.worker = _Worker(self.headless)
+        try:
+            self._ensure_browser(worker)
+            worker.pooled = self._new_context(worker)
+        except Exception as e:
+            ready.set_exception(e)
+        else:
+            ready.set_result(None)
+
+        try:
+            while (job := self._jobs.get()) is not None:
+                future, fn, args, kwargs = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            self._shutdown(worker)
+
+    # ── 生命周期 ──────────────────────────────────────────────────
+
+    def start(self):
+        if self._threads:
+            return self
+        readies = []
+        for i in range(self.size):
+            ready = Future()
+            thread = threading.Thread(target=self._serve, args=(ready,),
+                                      name=f"browser-pool-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            readies.append(ready)
+        for ready in readies:
+            # 某个线程启动失败时浏览器会在第一次 lease() 时重试，这里只报告
+            try:
+                ready.result()
+            except Exception as e:
+                print(f"[BrowserPool] 浏览器启动失败: {e}")
+        print(f"[BrowserPool] 已启动 {self.size} 个浏览器，各预热 1 个 context")
+        return self
+
+    def _ensure_browser(self, worker: _Worker):
+        """浏览器进程崩溃/断开后重新拉起，旧 context 作废"""
+        if worker.started and worker.manager._browser.is_connected():
+            return
+        if worker.started:
+            print("[BrowserPool] 浏览器已断开，重新启动")
+            worker.pooled = None
+            try:
+                worker.manager.__exit__()
+            except Exception:
+                pass
+            worker.started = False
+        worker.manager.__enter__()
+        worker.started = True
+
+    def _new_context(self, worker: _Worker) -> PooledContext:
+        context = worker.manager.new_context()
+        page = context.new_page()
+        if self.warm_url:
+            # 预先建好连接、拿到首页 cookies/缓存，失败不影响使用
+            try:
+                page.goto(self.warm_url, wait_until="domcontentloaded", timeout=15000)
+            except Exception as e:
+                print(f"[BrowserPool] 预热失败: {e}")
+        return PooledContext(context=context, page=page)
+
+    def _healthy(self, pooled: PooledContext) -> bool:
+        if pooled.broken or pooled.page.is_closed():
+            return False
+        try:
+            return pooled.page.evaluate("1") == 1
+        except Exception:
+            return False
+
+    def _discard(self, pooled: PooledContext):
+        try:
+            pooled.context.close()
+        except Exception:
+            pass
+
+    def _shutdown(self, worker: _Worker):
+        if worker.pooled is not None:
+            self._discard(worker.pooled)
+            worker.pooled = None
+        if worker.started:
+            try:
+                worker.manager.__exit__()
+            except Exception:
+                pass
+            worker.started = False
+
+    # ── 借出 / 归还 ──────────────────────────────────────────────────
+
+    @contextmanager
+    def lease(self):
+        worker = self._worker()
+        if worker is None:
+            raise RuntimeError("BrowserPool.lease() 只能在池线程内使用，请改用 pool.run()")
+        self._ensure_browser(worker)
+
+        pooled, worker.pooled = worker.pooled, None
+        if pooled is not None and not self._healthy(pooled):
+            self._discard(pooled)
+            pooled = None
+        if pooled is None:
+            pooled = self._new_context(worker)
+
+        try:
+            yield pooled
+        except Exception:
+            # 页面可能停在半加载状态，不再复用
+            pooled.broken = True
+            raise
+        finally:
+            pooled.uses += 1
+            if pooled.broken or pooled.uses >= self.max_uses:
+                self._discard(pooled)
+                try:
+                    worker.pooled = self._new_context(worker)
+                except Exception as e:
+                    print(f"[BrowserPool] 重建 context 失败，下次借出时再试: {e}")
+            else:
+                try:
+                    pooled.page.goto("about:blank")
+                    worker.pooled = pooled
+                except Exception:
+                    self._discard(pooled)
+
+    def close(self):
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(headless: bool = True) -> BrowserPool:
+    """进程级单例，第一次调用时启动浏览器"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(headless=headless).start()
+        return _pool
@@ -0,0 +1,315 @@
+import asyncio
+
+from scraper.http_client import api_get_async, POOL_LIMITS
+from storage.models import Comment
+
+# Per-fetcher cap; the default never binds before the host-wide AIMD limit,
+# which is itself capped at the connection pool size. Lower it to pin a fetcher
+DEFAULT_CONCURRENCY = POOL_LIMITS.max_connections
+STREAM_BUFFER_PAGES = 4   # Pages buffered ahead of the stream_unique consumer
+
+
+def parse_reply(item: dict, video_id: str, parent_id: str) -> Comment:
+    s = item["snippet"]
+    return Comment(
+        comment_id=item["id"],
+        video_id=video_id,
+        parent_id=parent_id,
+        username=s.get("authorDisplayName", ""),
+        text=s.get("textOriginal", ""),
+        like_count=s.get("likeCount", 0),
+        reply_count=0,
+        created_at=s.get("publishedAt", ""),
+    )
+
+
+def parse_thread(item: dict, video_id: str) -> tuple[Comment, list[Comment]]:
+    """
+    Parse one commentThreads item
+    Returns: (top-level comment, embedded replies)
+    """
+    top = item["snippet"]["topLevelComment"]["snippet"]
+    comment_id = item["snippet"]["topLevelComment"]["id"]
+    comment = Comment(
+        comment_id=comment_id,
+        video_id=video_id,
+        parent_id=None,
+        username=top.get("authorDisplayName", ""),
+        text=top.get("textOriginal", ""),
+        like_count=top.get("likeCount", 0),
+        reply_count=item["snippet"].get("totalReplyCount", 0),
+        created_at=top.get("publishedAt", ""),
+    )
+    embedded = [
+        parse_reply(r, video_id, comment_id)
+        for r in item.get("replies", {}).get("comments", [])
+    ]
+    return comment, embedded
+
+
+class AsyncCommentFetcher:
+    """
+    asyncio comment crawler on the shared httpx.AsyncClient.
+    Threads whose replies don't fit in the 5 embedded ones are expanded
+    with comments.list calls that run in parallel, at most `concurrency`
+    requests in flight. Transient 429 / 5xx responses are retried by
+    scraper.rate_control, so a request that still fails here is final.
+    With expand_replies=False only the embedded replies
+    are kept (cheap plan when quota is low).
+
+    Usage:
+        fetcher = AsyncCommentFetcher()
+        comments = run_async(fetcher.fetch_all(video_id))
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, expand_replies: bool = True):
+        self.concurrency = concurrency
+        self.expand_replies = expand_replies
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _get(self, endpoint: str, params: dict) -> dict:
+        async with self._semaphore:
+            return await api_get_async(endpoint, params)
+
+    async def fetch_replies(self, parent_id: str, video_id: str) -> list[Comment]:
+        replies = []
+        next_page_token = None
+
+        while True:
+            params = {
+                "parentId": parent_id,
+                "part": "snippet",
+                "maxResults": 100,
+            }
+            if next_page_token:
+                params["pageToken"] = next_page_token
+
+            try:
+                data = await self._get("comments", params)
+            except Exception as e:
+                print(f"    [Reply] Request failed after retries, replies of {parent_id} truncated: {e}")
+                break
+
+            replies.extend(parse_reply(item, video_id, parent_id) for item in data.get("items", []))
+
+            next_page_token = data.get("nextPageToken")
+            if not next_page_token:
+                break
+
+        return replies
+
+    async def iter_pages(self, video_id: str, order: str, max_pages: int,
+                         known: dict = None, since: str = None):
+        """
+        Yield one list[Comment] per commentThreads page, replies expanded
+        order: "relevance" or "time"
+        known / since (time order only): stop as soon as a thread that is already
+        stored, or older than `since`, shows up
+        """
+        next_page_token = None
+        page = 1
+        top_count = 0
+        reply_count_total = 0
+
+        while page <= max_pages:
+            params = {
+                "videoId": video_id,
+                "part": "snippet,replies",
+                "maxResults": 100,
+                "order": order,
+            }
+            if next_page_token:
+                params["pageToken"] = next_page_token
+
+            try:
+                data = await self._get("commentThreads", params)
+            except Exception as e:
+                print(f"    [Page {page}] Request failed after retries, {order} crawl stopped: {e}")
+                break
+
+            comments = []
+            expand = []
+            reached_known = False
+            for item in data.get("items", []):
+                comment, embedded = parse_thread(item, video_id)
+                if known is not None and (
+                        comment.comment_id in known or (since and comment.created_at < since)):
+                    reached_known = True
+                    break
+                comments.append(comment)
+                if comment.reply_count <= len(embedded) or not self.expand_replies:
+                    comments.extend(embedded)
+                else:
+                    expand.append(comment.comment_id)
+
+            # Fan out reply crawls for every thread on this page at once
+            if expand:
+                print(f"    └─ Fetching replies for {len(expand)} threads ({order})...")
+                results = await asyncio.gather(
+                    *(self.fetch_replies(comment_id, video_id) for comment_id in expand)
+                )
+                for replies in results:
+                    comments.extend(replies)
+
+            top_count += sum(1 for c in comments if c.parent_id is None)
+            reply_count_total += sum(1 for c in comments if c.parent_id is not None)
+            print(f"    Page {page}/{max_pages} ({order}): Top-level {top_count}, Replies {reply_count_total}")
+
+            yield comments
+
+            if reached_known:
+                print(f"    Reached stored comments at page {page} ({order})")
+                break
+
+            next_page_token = data.get("nextPageToken")
+            if not next_page_token:
+                print(f"    Reached last page at page {page} ({order})")
+                break
+
+            page += 1
+
+    async def fetch_by_order(self, video_id: str, order: str, max_pages: int,
+                             known: dict = None, since: str = None) -> list[Comment]:
+        comments = []
+        async for page in self.iter_pages(video_id, order, max_pages, known, since):
+            comments.extend(page)
+        return comments
+
+    async def refresh_hot_threads(self, video_id: str, known: dict, hot_threads: int,
+                                  known_replies: set = frozenset()) -> tuple[list[Comment], list[Comment]]:
+        """
+        Re-read the top `hot_threads` threads by relevance.
+        Returns: (new comments, refreshed top-level comments that are already stored)
+        Replies are only re-crawled for threads whose reply count grew, and those
+        already in `known_replies` are dropped so they are not analyzed again.
+        """
+        try:
+            data = await self._get("commentThreads", {
+                "videoId": video_id,
+                "part": "snippet,replies",
+                "maxResults": min(hot_threads, 100),
+                "order": "relevance",
+            })
+        except Exception as e:
+            print(f"    [Hot threads] Request failed after retries: {e}")
+            return [], []
+
+        new_comments = []
+        refreshed = []
+        expand = []
+        for item in data.get("items", []):
+            comment, embedded = parse_thread(item, video_id)
+            stored_replies = known.get(comment.comment_id)
+            if stored_replies is None:
+                new_comments.append(comment)
+            else:
+                refreshed.append(comment)
+                if comment.reply_count <= stored_replies:
+                    continue
+            if comment.reply_count <= len(embedded) or not self.expand_replies:
+                new_comments.extend(embedded)
+            else:
+                expand.append(comment.comment_id)
+
+        if expand:
+            print(f"    └─ Fetching replies for {len(expand)} hot threads...")
+            for replies in await asyncio.gather(
+                    *(self.fetch_replies(comment_id, video_id) for comment_id in expand)):
+                new_comments.extend(replies)
+        new_comments = [c for c in new_comments if c.comment_id not in known_replies]
+
+        print(f"    Hot threads: refreshed {len(refreshed)}, new comments {len(new_comments)}")
+        return new_comments, refreshed
+
+    async def fetch_delta(self, video_id: str, sync_state: dict, max_pages: int = 3,
+                          hot_threads: int = 100) -> tuple[list[Comment], list[Comment]]:
+        """
+        Incremental crawl against what is already stored (see database.get_sync_state):
+        time order stops at the first known thread, and only the hot top-N threads
+        are re-read to refresh like / reply counts.
+        Returns: (new comments, refreshed top-level comments)
+        """
+        known = sync_state["reply_counts"]
+        print(f"\n  Delta sync: {len(known)} threads stored, newest {sync_state['newest_created_at']}")
+
+        time_pages, (hot_new, refreshed) = await asyncio.gather(
+            self.fetch_by_order(video_id, "time", max_pages, known=known,
+                                since=sync_state["newest_created_at"]),
+            self.refresh_hot_threads(video_id, known, hot_threads, sync_state["reply_ids"]),
+        )
+
+        new_comments = []
+        seen_ids = set()
+        for comment in time_pages + hot_new:
+            if comment.comment_id not in seen_ids:
+                seen_ids.add(comment.comment_id)
+                new_comments.append(comment)
+
+        print(f"  → Got {len(new_comments)} new comments")
+        return new_comments, refreshed
+
+    async def stream_unique(self, video_id: str, max_pages_per_order: int = 3):
+        """
+        Crawl relevance order (hot/popular) and time order (newest) concurrently.
+        Pages from both crawls are merged through one dedup stage, which yields
+        each page's not-yet-seen comments as soon as the page arrives.
+        """
+        orders = ("relevance", "time")
+        # Bounded, so a slow consumer pauses the crawl instead of buffering everything
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER_PAGES)
+
+        async def produce(order: str):
+            # Every exit ends with an (order, None | exception) marker, otherwise
+            # the consumer's queue.get() below would wait forever
+            error = None
+            try:
+                async for page in self.iter_pages(video_id, order, max_pages_per_order):
+                    await queue.put((order, page))
+            except asyncio.CancelledError as e:
+                # Normally the consumer cancelled us and no longer reads; if someone
+                # else did, wake the consumer if there is room, without blocking
+                try:
+                    queue.put_nowait((order, e))
+                except asyncio.QueueFull:
+                    pass
+                raise
+            except Exception as e:      # e.g. a malformed item in parse_thread
+                error = e
+            await queue.put((order, error))
+
+        print(f"\n  Fetching popular (relevance) and newest (time) comments concurrently...")
+        tasks = [asyncio.create_task(produce(order)) for order in orders]
+        seen_ids = set()
+        new_counts = dict.fromkeys(orders, 0)
+        running = len(tasks)
+
+        try:
+            while running:
+                order, page = await queue.get()
+                if isinstance(page, BaseException):
+                    raise page
+                if page is None:
+                    running -= 1
+                    print(f"  → Got {new_counts[order]} new comments from {order} order")
+                    continue
+
+                unique = []
+                for comment in page:
+                    if comment.comment_id not in seen_ids:
+                        seen_ids.add(comment.comment_id)
+                        unique.append(comment)
+                new_counts[order] += len(unique)
+                if unique:
+                    yield unique
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        print(f"  → Total unique comments: {len(seen_ids)}")
+
+    async def fetch_all(self, video_id: str, max_pages_per_order: int = 3) -> list[Comment]:
+        all_comments = []
+        async for page in self.stream_unique(video_id, max_pages_per_order):
+            all_comments.extend(page)
+        return all_comments
@@ -1,10 +1,7 @@
-import httpx
 from datetime import datetime
-from config import YOUTUBE_API_KEY
+from scraper.http_client import api_get
 from storage.models import Comment
 
-COMMENTS_URL = "https://www.googleapis.com/youtube/v3/commentThreads"
-
 class CommentScraper:
     def fetch_comments(self, video_id: str, max_count: int = 100) -> list[Comment]:
         print(f"[CommentScraper] 抓取视频 {video_id} 的评论")
@@ -13,7 +10,6 @@ class CommentScraper:
 
         while len(comments) < max_count:
             params = {
-                "key":        YOUTUBE_API_KEY,
                 "videoId":    video_id,
                 "part":       "snippet",
                 "maxResults": min(100, max_count - len(comments)),
@@ -23,9 +19,7 @@ class CommentScraper:
                 params["pageToken"] = next_page_token
 
             try:
-                resp = httpx.get(COMMENTS_URL, params=params)
-                resp.raise_for_status()
-                data = resp.json()
+                data = api_get("commentThreads", params)
             except Exception as e:
                 print(f"[CommentScraper] 请求失败: {e}")
                 break
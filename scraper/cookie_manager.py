@@ -1,37 +1,194 @@
 import json
 import os
+import threading
+import time
 
 COOKIE_FILE = "cookies.json"
 TIKTOK_DOMAINS = ["tiktok.com"]
 
+REFRESH_MARGIN = 3600       # 最早过期的 cookie 剩不到这么多秒时，后台提前刷新
+CHECK_INTERVAL = 60         # 后台线程检查文件变动/过期的间隔（秒）
+REFRESH_RETRY = 600         # 刷新失败或没有拿到更新的 cookie 时，至少隔这么久再试，避免每次检查都去读 Safari
 
-def get_cookies(force_refresh: bool = False) -> dict:
+
+def _normalize(raw) -> tuple[dict, dict]:
     """
-    优先读取本地缓存。
-    没有缓存时直接从 Safari 读取已登录的 cookies，无需重新登录。
+    cookies.json 有两种格式：
+      - Playwright / rookiepy 导出的列表 [{"name", "value", "expires", ...}]
+      - 旧版缓存的 {name: value}
+    统一成 ({name: value}, {name: 过期时间戳})，会话 cookie（expires <= 0）不记过期时间
     """
-    if not force_refresh and os.path.exists(COOKIE_FILE):
-        print("[CookieManager] 从本地缓存加载 cookies")
-        with open(COOKIE_FILE) as f:
-            return json.load(f)
+    if isinstance(raw, dict):
+        return dict(raw), {}
+    cookies, expiries = {}, {}
+    for c in raw:
+        cookies[c["name"]] = c["value"]
+        expires = c.get("expires") or 0
+        if expires > 0:
+            expiries[c["name"]] = float(expires)
+    return cookies, expiries
+
+
+class CookieStore:
+    """
+    进程级 cookie 缓存：启动时读一次 cookies.json，之后 get() 只读内存。
+    后台线程负责两件事：
+      - cookies.json 被外部改写（mtime 变化）时重新加载
+      - 有 cookie 快过期时提前从 Safari 重新读取并写回文件
+    """
+
+    def __init__(self, path: str = COOKIE_FILE, refresh_margin: float = REFRESH_MARGIN,
+                 check_interval: float = CHECK_INTERVAL):
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self._cookies = {}
+        self._expiries = {}
+        self._mtime = None
+        self._stale = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    # ── 读取 ──────────────────────────────────────────────────
+
+    def get(self) -> dict:
+        """当前有效的 cookies（已过期的剔除），不做磁盘 I/O"""
+        now = time.time()
+        with self._lock:
+            return {
+                name: value for name, value in self._cookies.items()
+                if self._expiries.get(name, float("inf")) > now
+            }
+
+    def expires_at(self) -> float | None:
+        """还有效的 cookie 里最早过期的时间戳；已经过期的不算，否则 min() 永远落在过去"""
+        now = time.time()
+        with self._lock:
+            return min((t for t in self._expiries.values() if t > now), default=None)
+
+    def needs_refresh(self) -> bool:
+        expires_at = self.expires_at()
+        with self._lock:
+            stale = self._stale
+        return stale or not self.get() or (
+            expires_at is not None and expires_at - time.time() < self.refresh_margin
+        )
+
+    # ── 加载 / 刷新 ──────────────────────────────────────────────────
+
+    def _load_file(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path) as f:
+                cookies, expiries = _normalize(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[CookieManager] 读取 {self.path} 失败: {e}")
+            return False
+        with self._lock:
+            self._cookies, self._expiries, self._mtime = cookies, expiries, mtime
+        print(f"[CookieManager] 从本地缓存加载 {len(cookies)} 个 cookies")
+        return True
+
+    def refresh(self) -> bool:
+        """从 Safari 重新读取并写回 cookies.json；失败时保留现有 cookies"""
+        print("[CookieManager] 正在从 Safari 读取 TikTok cookies...")
+        try:
+            raw = _read_from_safari()
+        except Exception as e:
+            print(f"[CookieManager] 刷新失败，继续使用现有 cookies: {e}")
+            return False
 
-    print("[CookieManager] 正在从 Safari 读取 TikTok cookies...")
-    cookies = _read_from_safari()
+        # 先写临时文件再替换，读的一方不会看到写了一半的 JSON
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(raw, f, indent=2)
+        os.replace(tmp_path, self.path)
 
-    # 缓存到本地，下次直接复用
-    with open(COOKIE_FILE, "w") as f:
-        json.dump(cookies, f, indent=2)
-    print(f"[CookieManager] 已读取 {len(cookies)} 个 cookies 并缓存到 {COOKIE_FILE}")
+        cookies, expiries = _normalize(raw)
+        with self._lock:
+            self._cookies, self._expiries = cookies, expiries
+            self._mtime = os.path.getmtime(self.path)
+            self._stale = False
+        print(f"[CookieManager] 已读取 {len(cookies)} 个 cookies 并缓存到 {self.path}")
+        return True
 
-    return cookies
+    def _file_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        with self._lock:
+            return mtime != self._mtime
+
+    # ── 后台线程 ──────────────────────────────────────────────────
+
+    def start(self):
+        if not os.path.exists(self.path) or not self._load_file() or self.needs_refresh():
+            self.refresh()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="cookie-store", daemon=True)
+            self._thread.start()
+        return self
+
+    def _watch(self):
+        while True:
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+            try:
+                if self._file_changed():
+                    self._load_file()
+                if self.needs_refresh() and time.time() >= self._retry_at:
+                    self.refresh()
+                    # 刷新失败，或 Safari 里的 cookie 本身也快过期（过期时间没往后推）：都先退避
+                    if self.needs_refresh():
+                        self._retry_at = time.time() + REFRESH_RETRY
+            except Exception as e:
+                print(f"[CookieManager] 后台检查出错: {e}")
+
+    def invalidate(self):
+        """cookies 被服务端拒绝时调用：立即在后台刷新，不等过期时间"""
+        with self._lock:
+            self._stale = True
+        self._retry_at = 0.0
+        self._wakeup.set()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cookie_store() -> CookieStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CookieStore().start()
+        return _store
+
+
+def get_cookies(force_refresh: bool = False) -> dict:
+    """
+    返回内存中的有效 cookies，首次调用时加载本地缓存。
+    没有缓存或即将过期时从 Safari 读取已登录的 cookies，无需重新登录。
+    """
+    store = get_cookie_store()
+    if force_refresh:
+        store.refresh()
+    return store.get()
 
 
-def _read_from_safari() -> dict:
+def _read_from_safari() -> list[dict]:
+    """返回与 cookies.json 相同的列表格式，保留过期时间"""
     # 优先用 rookiepy
     try:
         import rookiepy
         raw = rookiepy.safari(TIKTOK_DOMAINS)
-        cookies = {c["name"]: c["value"] for c in raw}
+        cookies = [
+            {"name": c["name"], "value": c["value"], "domain": c.get("domain", ""),
+             "path": c.get("path", "/"), "expires": c.get("expires") or -1}
+            for c in raw
+        ]
         if not cookies:
             raise ValueError("读取到 0 个 cookies，请确认 Safari 中已登录 TikTok")
         return cookies
@@ -42,7 +199,11 @@ def _read_from_safari() -> dict:
     try:
         import browser_cookie3
         jar = browser_cookie3.safari(domain_name="tiktok.com")
-        cookies = {c.name: c.value for c in jar}
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain,
+             "path": c.path, "expires": c.expires or -1}
+            for c in jar
+        ]
         if not cookies:
             raise ValueError("读取到 0 个 cookies，请确认 Safari 中已登录 TikTok")
         return cookies
@@ -56,7 +217,9 @@ def _read_from_safari() -> dict:
 
 
 def clear_cache():
-    """cookies 失效时调用这个清除缓存，下次重新从 Safari 读取"""
+    """cookies 失效时调用这个清除缓存，并让后台线程立即重新从 Safari 读取"""
     if os.path.exists(COOKIE_FILE):
         os.remove(COOKIE_FILE)
-        print(f"[CookieManager] 已清除缓存 {COOKIE_FILE}")
\ No newline at end of file
+        print(f"[CookieManager] 已清除缓存 {COOKIE_FILE}")
+    if _store is not None:
+        _store.invalidate()
@@ -0,0 +1,230 @@
+"""
+Process-wide HTTP client layer for the YouTube Data API.
+
+Every fetcher goes through the clients here instead of module-level
+httpx.get, so connections to googleapis.com are pooled and kept alive
+(HTTP/2 multiplexed when the `h2` package is installed), and the API key,
+timeouts and pool limits are configured in one place.
+
+Endpoints are passed relative to API_BASE, e.g. api_get("videos", {...}).
+Responses go through the on-disk cache (scraper.response_cache) with ETag
+revalidation, and each request that actually goes out is charged to the
+daily quota ledger (scraper.quota) first. In-flight requests per host are
+capped by an adaptive controller (scraper.rate_control), and 429 / rate-limit
+/ 5xx responses are retried with backoff instead of surfacing to the caller.
+"""
+import asyncio
+import atexit
+import os
+import threading
+import time
+
+import httpx
+from config import YOUTUBE_API_KEY
+from scraper import response_cache, rate_control
+from scraper.quota import get_budget
+
+DEFAULT_API_BASE = "https://www.googleapis.com/youtube/v3"
+# Point at a local stand-in (mock_youtube_server.py) for load testing
+API_BASE = os.environ.get("YOUTUBE_API_BASE", DEFAULT_API_BASE)
+# Requests to a mock server are not charged to the real quota ledger
+CHARGE_QUOTA = API_BASE == DEFAULT_API_BASE
+if not CHARGE_QUOTA:
+    response_cache.use_api_base(API_BASE)
+
+USE_HTTP2 = True          # Only takes effect when `h2` is installed
+REQUEST_TIMEOUT = httpx.Timeout(15, connect=5)
+POOL_LIMITS = httpx.Limits(
+    max_connections=20,
+    max_keepalive_connections=10,
+    keepalive_expiry=30,
+)
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_loop = None
+
+
+def _http2_enabled() -> bool:
+    if not USE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _client_options() -> dict:
+    return dict(
+        base_url=API_BASE,
+        params={"key": YOUTUBE_API_KEY},
+        timeout=REQUEST_TIMEOUT,
+        limits=POOL_LIMITS,
+        http2=_http2_enabled(),
+    )
+
+
+def get_client() -> httpx.Client:
+    """Shared blocking client, safe to use from any thread"""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(**_client_options())
+        return _client
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Background event loop that owns the shared AsyncClient"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="http-client-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared async client; only valid inside coroutines started with run_async()"""
+    global _async_client
+    if asyncio.get_running_loop() is not _loop:
+        raise RuntimeError("get_async_client() must be used from run_async()")
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_client_options())
+    return _async_client
+
+
+def run_async(coro):
+    """Run a coroutine on the shared loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def iter_async(agen):
+    """Consume an async generator on the shared loop as a plain generator"""
+    loop = _get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+
+def _before_request(endpoint: str, params: dict):
+    """
+    Returns (cached body or None, cache entry, conditional headers)
+    A body is returned when the request doesn't need to go out at all
+    """
+    entry = response_cache.lookup(endpoint, params)
+    if entry is not None and (response_cache.replay_only() or response_cache.is_fresh(entry)):
+        return entry["body"], entry, {}
+    if response_cache.replay_only():
+        raise response_cache.CacheMissError(f"No cached response for {endpoint} {params}")
+
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else {}
+    return None, entry, headers
+
+
+def _after_response(endpoint: str, params: dict, entry: dict, resp: httpx.Response) -> dict:
+    if resp.status_code == 304 and entry is not None:
+        response_cache.touch(endpoint, params, entry)
+        return entry["body"]
+    resp.raise_for_status()
+    body = resp.json()
+    response_cache.store(endpoint, params, body, resp.headers.get("etag"))
+    return body
+
+
+def _controller() -> rate_control.HostController:
+    return rate_control.get_controller(httpx.URL(API_BASE).host,
+                                       max_limit=POOL_LIMITS.max_connections)
+
+
+def _should_retry(controller, endpoint: str, attempt: int, resp=None, error=None):
+    """
+    Feeds the outcome of one attempt back to the controller
+    Returns the delay before the next attempt, or None if the result is final
+    """
+    if error is None and not rate_control.is_throttled(resp):
+        return None
+    if error is not None:
+        controller.on_error()
+    else:
+        controller.on_throttle()
+    if attempt >= rate_control.MAX_RETRIES:
+        return None
+    controller.on_retry()
+    delay = rate_control.retry_delay(attempt, resp)
+    reason = error.__class__.__name__ if error is not None else resp.status_code
+    print(f"  [HTTP] {endpoint} {reason}, retry {attempt + 1}/{rate_control.MAX_RETRIES} in {delay:.1f}s")
+    return delay
+
+
+def api_get(endpoint: str, params: dict) -> dict:
+    body, entry, headers = _before_request(endpoint, params)
+    if body is not None:
+        return body
+    controller = _controller()
+    for attempt in range(rate_control.MAX_RETRIES + 1):
+        # Every attempt that goes out costs quota, retries included
+        if CHARGE_QUOTA:
+            get_budget().charge(endpoint)
+        resp, error = None, None
+        with controller.slot():
+            start = time.monotonic()
+            try:
+                resp = get_client().get(endpoint, params=params, headers=headers)
+            except httpx.TransportError as e:
+                error = e
+        delay = _should_retry(controller, endpoint, attempt, resp, error)
+        if delay is None:
+            break
+        time.sleep(delay)
+    if error is not None:
+        raise error
+    if resp.is_success or resp.status_code == 304:
+        controller.on_success(time.monotonic() - start)
+    return _after_response(endpoint, params, entry, resp)
+
+
+async def api_get_async(endpoint: str, params: dict) -> dict:
+    # Cache reads/writes are file I/O: keep them off the shared event loop
+    body, entry, headers = await asyncio.to_thread(_before_request, endpoint, params)
+    if body is not None:
+        return body
+    controller = _controller()
+    for attempt in range(rate_control.MAX_RETRIES + 1):
+        if CHARGE_QUOTA:
+            get_budget().charge(endpoint)
+        resp, error = None, None
+        async with controller.async_slot():
+            start = time.monotonic()
+            try:
+                resp = await get_async_client().get(endpoint, params=params, headers=headers)
+            except httpx.TransportError as e:
+                error = e
+        delay = _should_retry(controller, endpoint, attempt, resp, error)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+    if error is not None:
+        raise error
+    if resp.is_success or resp.status_code == 304:
+        controller.on_success(time.monotonic() - start)
+    return await asyncio.to_thread(_after_response, endpoint, params, entry, resp)
+
+
+@atexit.register
+def close():
+    global _client, _async_client
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _async_client is not None and _loop is not None and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(_async_client.aclose(), _loop).result(timeout=5)
+        _async_client = None
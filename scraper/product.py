@@ -1,68 +1,59 @@
 import time
-from playwright.sync_api import Page
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 from storage.models import Product
 from typing import Optional
 
+# 快速模式下直接拦掉的资源类型，商品数据只来自 XHR/fetch 的 JSON
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+LOOKUP_DEADLINE_MS = 10000  # 快速模式等待第一条商品 JSON 的上限
+POLL_INTERVAL_MS = 50       # 快速模式检查是否已拿到商品数据的间隔
+
+
 class ProductSearcher:
-    def __init__(self, browser_manager):
-        self.bm = browser_manager
+    def __init__(self, browser_pool, fast: bool = True, deadline_ms: int = LOOKUP_DEADLINE_MS):
+        """
+        browser_pool: scraper.browser.BrowserPool，复用常驻浏览器里预热好的 context
+        fast: True 时拦截图片/字体/视频，拿到第一条带商品的 JSON 响应就返回；
+              False 时沿用等待 networkidle + 2 秒的旧逻辑
+        deadline_ms: 快速模式的等待上限
+        """
+        self.pool = browser_pool
+        self.fast = fast
+        self.deadline_ms = deadline_ms
 
     def search(self, keyword: str, max_results: int = 10) -> list[Product]:
         """通过关键词搜索 TikTok Shop 商品，返回 Product 列表"""
-        products = []
-        captured = []
+        return self.pool.run(self._search, keyword, max_results)
 
-        with self.bm.new_context() as ctx:
-            page = ctx.new_page()
-
-            # 拦截商品搜索的 API 响应
-            def handle_response(response):
-                if "tiktok.com" in response.url and "search" in response.url and response.status == 200:
-                    try:
-                        data = response.json()
-                        captured.append(data)
-                    except:
-                        pass
-
-            page.on("response", handle_response)
-
-            # 访问 TikTok Shop 搜索页
-            page.goto(
-                f"https://www.tiktok.com/search?q={keyword}&type=product",
-                wait_until="networkidle",
-                timeout=30000
-            )
-            time.sleep(2)
-
-            # 解析捕获的响应
-            for data in captured:
-                products.extend(self._parse_products(data))
-                if len(products) >= max_results:
-                    break
+    def _search(self, lease, keyword: str, max_results: int) -> list[Product]:
+        # 拦截商品搜索的 API 响应
+        def is_match(response):
+            return "tiktok.com" in response.url and "search" in response.url and response.status == 200
+
+        captured = self._capture(
+            lease.page, f"https://www.tiktok.com/search?q={keyword}&type=product", is_match
+        )
+
+        # 解析捕获的响应
+        products = []
+        for data in captured:
+            products.extend(self._parse_products(data))
+            if len(products) >= max_results:
+                break
 
         return products[:max_results]
 
     def get_by_id(self, product_id: str) -> Optional[Product]:
         """直接通过 product_id 获取商品基础信息"""
-        captured = []
-
-        with self.bm.new_context() as ctx:
-            page = ctx.new_page()
+        return self.pool.run(self._get_by_id, product_id)
 
-            def handle_response(response):
-                if "product" in response.url and response.status == 200:
-                    try:
-                        captured.append(response.json())
-                    except:
-                        pass
+    def _get_by_id(self, lease, product_id: str) -> Optional[Product]:
+        def is_match(response):
+            return "product" in response.url and response.status == 200
 
-            page.on("response", handle_response)
-            page.goto(
-                f"https://www.tiktok.com/shop/product/{product_id}",
-                wait_until="networkidle",
-                timeout=30000
-            )
-            time.sleep(2)
+        captured = self._capture(
+            lease.page, f"https://www.tiktok.com/shop/product/{product_id}", is_match
+        )
 
         for data in captured:
             products = self._parse_products(data)
@@ -70,6 +61,60 @@ class ProductSearcher:
                 return products[0]
         return None
 
+    # ── 页面加载 ──────────────────────────────────────────────────
+
+    def _capture(self, page: Page, url: str, is_match) -> list[dict]:
+        """打开 url，收集 is_match 命中的 JSON 响应"""
+        captured = []
+
+        # 只收能解析出商品的 JSON：页面上其它带 search 的接口（推荐词、埋点等）直接丢掉
+        def handle_response(response):
+            if not is_match(response):
+                return
+            try:
+                data = response.json()
+            except:
+                return
+            if self._parse_products(data):
+                captured.append(data)
+
+        # 页面会被下一次借用复用，监听器和路由用完必须摘掉
+        page.on("response", handle_response)
+        try:
+            if self.fast:
+                self._load_fast(page, url, captured)
+            else:
+                page.goto(url, wait_until="networkidle", timeout=30000)
+                time.sleep(2)
+        finally:
+            page.remove_listener("response", handle_response)
+        return captured
+
+    def _load_fast(self, page: Page, url: str, captured: list):
+        """
+        图片/字体/视频直接 abort，等到 captured 里出现第一条带商品的 JSON 就返回，
+        最多等 deadline_ms；超时就用已捕获的内容（可能为空）
+        """
+        def block_heavy(route):
+            if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+                route.abort()
+            else:
+                route.continue_()
+
+        page.route("**/*", block_heavy)
+        try:
+            deadline = time.monotonic() + self.deadline_ms / 1000
+            page.goto(url, wait_until="commit", timeout=self.deadline_ms)
+            # wait_for_timeout 期间响应事件照常派发给 handle_response
+            while not captured and time.monotonic() < deadline:
+                page.wait_for_timeout(POLL_INTERVAL_MS)
+            if not captured:
+                print(f"[ProductSearcher] {self.deadline_ms}ms 内没有拿到商品数据: {url}")
+        except PlaywrightTimeoutError:
+            print(f"[ProductSearcher] {self.deadline_ms}ms 内没有拿到商品数据: {url}")
+        finally:
+            page.unroute("**/*", block_heavy)
+
     def _parse_products(self, raw_data: dict) -> list[Product]:
         """
         解析搜索结果，字段名需根据实际抓包结果调整。
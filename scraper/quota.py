@@ -0,0 +1,240 @@
+"""
+YouTube Data API quota accounting.
+
+Every request made through scraper.http_client is charged to a per-day,
+per-endpoint ledger in the api_quota table. Charging is an in-memory check;
+the ledger rows are written in batches by a background thread every
+FLUSH_INTERVAL seconds (and at exit), so no request, and in particular
+nothing on the shared asyncio loop, waits on a SQLite write lock.
+Callers can reserve units up
+front so concurrent pipelines don't both plan against the same headroom,
+and comment crawls are planned to fit the remaining budget instead of
+failing halfway through.
+"""
+import atexit
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from storage.database import record_quota_usage, get_quota_usage
+
+DAILY_QUOTA = 10_000
+ENDPOINT_COSTS = {
+    "search":         100,
+    "videos":         1,
+    "commentThreads": 1,
+    "comments":       1,
+}
+# Rough cost of one commentThreads page incl. reply expansion, used for planning
+REPLY_CALLS_PER_PAGE = 10
+FLUSH_INTERVAL = 2.0    # Seconds between ledger writes
+
+_reservation = contextvars.ContextVar("quota_reservation", default=None)
+
+
+class QuotaExceededError(RuntimeError):
+    pass
+
+
+def quota_day() -> str:
+    """YouTube resets quota at midnight Pacific time"""
+    return datetime.now(ZoneInfo("America/Los_Angeles")).date().isoformat()
+
+
+def endpoint_cost(endpoint: str) -> int:
+    return ENDPOINT_COSTS.get(endpoint, 1)
+
+
+class Reservation:
+    """Units held for one caller; requests made inside `with` draw from it"""
+
+    def __init__(self, budget: "QuotaBudget", units: int, label: str):
+        self.budget = budget
+        self.units = units
+        self.held = units
+        self.label = label
+        self._token = None
+
+    def __enter__(self):
+        self._token = _reservation.set(self)
+        return self
+
+    def __exit__(self, *args):
+        _reservation.reset(self._token)
+        self.budget.release(self)
+
+
+class QuotaBudget:
+    def __init__(self, daily_quota: int = DAILY_QUOTA, flush_interval: float = FLUSH_INTERVAL):
+        self.daily_quota = daily_quota
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._reservations = set()
+        self._day = None
+        self._stored = 0            # Today's units in api_quota as of the last refresh
+        self._flushing = 0          # Units being written right now
+        self._pending = {}          # (day, endpoint) -> [calls, units] not yet written
+        self._thread = None
+
+    # ── In-memory accounting ──────────────────────────────────────────
+
+    def _refresh(self):
+        """Reload today's stored usage (also picks up other processes sharing the DB)"""
+        day = quota_day()
+        stored = sum(get_quota_usage(day).values())
+        with self._lock:
+            self._day, self._stored = day, stored
+
+    def _used_locked(self) -> int:
+        day = quota_day()
+        pending = sum(units for (d, _), (_, units) in self._pending.items() if d == day)
+        if day != self._day:
+            return pending      # New quota day: yesterday's rows no longer count
+        return self._stored + self._flushing + pending
+
+    def _held_locked(self) -> int:
+        return sum(r.held for r in self._reservations)
+
+    def used(self) -> int:
+        if self._day is None:
+            self._refresh()
+        with self._lock:
+            return self._used_locked()
+
+    def remaining(self) -> int:
+        """Units left today that are not held by any reservation"""
+        if self._day is None:
+            self._refresh()
+        with self._lock:
+            return self.daily_quota - self._used_locked() - self._held_locked()
+
+    def reserve(self, units: int, label: str = "") -> Reservation:
+        if self._day is None:
+            self._refresh()
+        with self._lock:
+            available = self.daily_quota - self._used_locked() - self._held_locked()
+            if units > available:
+                raise QuotaExceededError(
+                    f"Cannot reserve {units} units for {label or 'request'}: {available} left today"
+                )
+            reservation = Reservation(self, units, label)
+            self._reservations.add(reservation)
+        return reservation
+
+    def release(self, reservation: Reservation):
+        with self._lock:
+            self._reservations.discard(reservation)
+
+    def charge(self, endpoint: str):
+        """
+        Called before each request; raises instead of overrunning the daily quota.
+        No I/O after the first call: the ledger write is queued for the flusher
+        """
+        if self._day is None:
+            self._refresh()
+        cost = endpoint_cost(endpoint)
+        reservation = _reservation.get()
+        with self._lock:
+            if reservation is not None and reservation.held >= cost:
+                reservation.held -= cost
+            elif cost > self.daily_quota - self._used_locked() - self._held_locked():
+                raise QuotaExceededError(f"Daily quota exhausted, refusing {endpoint} call")
+            entry = self._pending.setdefault((quota_day(), endpoint), [0, 0])
+            entry[0] += 1
+            entry[1] += cost
+        self._start_flusher()
+
+    # ── Ledger writes ──────────────────────────────────────────────────
+
+    def flush(self):
+        """Write queued charges to api_quota, then reload today's total"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                today = quota_day()
+                self._flushing = sum(units for (d, _), (_, units) in batch.items() if d == today)
+            try:
+                for (day, endpoint), (calls, units) in batch.items():
+                    record_quota_usage(day, endpoint, units, calls)
+            except Exception as e:
+                print(f"  [Quota] Failed to write usage ledger, will retry: {e}")
+                with self._lock:
+                    for key, (calls, units) in batch.items():
+                        entry = self._pending.setdefault(key, [0, 0])
+                        entry[0] += calls
+                        entry[1] += units
+                    self._flushing = 0
+                return
+            stored = sum(get_quota_usage(today).values())
+            with self._lock:
+                self._day, self._stored, self._flushing = today, stored, 0
+
+    def _start_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name="quota-flush", daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._pending:
+                self.flush()
+
+
+@dataclass
+class CrawlPlan:
+    max_pages_per_order: int
+    expand_replies: bool
+    units: int                  # Estimated cost, reserved by the caller
+
+
+def plan_comment_crawl(max_pages_per_order: int, budget: "QuotaBudget" = None) -> CrawlPlan:
+    """
+    Pick the richest comment crawl that fits the remaining budget:
+    full crawl → fewer pages → no reply expansion → QuotaExceededError
+    """
+    budget = budget or get_budget()
+    remaining = budget.remaining()
+    page_cost = endpoint_cost("commentThreads")
+    reply_cost = REPLY_CALLS_PER_PAGE * endpoint_cost("comments")
+
+    # Two orders (relevance + time) per crawl
+    pages = min(max_pages_per_order, remaining // (2 * (page_cost + reply_cost)))
+    if pages >= 1:
+        plan = CrawlPlan(pages, True, 2 * pages * (page_cost + reply_cost))
+    else:
+        pages = min(max_pages_per_order, remaining // (2 * page_cost))
+        if pages < 1:
+            raise QuotaExceededError(f"Only {remaining} quota units left, cannot fetch comments")
+        plan = CrawlPlan(pages, False, 2 * pages * page_cost)
+
+    if plan.max_pages_per_order < max_pages_per_order or not plan.expand_replies:
+        print(f"  [Quota] {remaining} units left, degraded crawl: "
+              f"{plan.max_pages_per_order} page(s)/order, replies {'on' if plan.expand_replies else 'off'}")
+    return plan
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> QuotaBudget:
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = QuotaBudget()
+        return _budget
+
+
+@atexit.register
+def _flush_on_exit():
+    if _budget is not None and _budget._pending:
+        _budget.flush()
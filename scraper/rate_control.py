@@ -0,0 +1,211 @@
+"""
+Adaptive (AIMD) concurrency control + retry policy shared by all API fetchers.
+
+One HostController per host caps the number of in-flight requests across
+every fetcher, sync or async. The cap grows by one after each full window of
+healthy responses (additive increase) and is halved on 429 / 403 rate-limit /
+5xx responses (multiplicative decrease). Retryable failures are retried with
+jittered exponential backoff, honouring Retry-After when the server sends it.
+RequestPacer adds a fixed requests-per-second budget on top, for endpoints
+(TikTok) that throttle on request rate rather than concurrency.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
+
+INITIAL_LIMIT = 8
+MIN_LIMIT = 1
+MAX_LIMIT = 64
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0     # seconds; one burst of errors only halves the limit once
+# Responses slower than this multiple of the fastest one seen are a sign of
+# queueing on the server side: hold the limit instead of increasing it
+LATENCY_TOLERANCE = 3.0
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5          # seconds
+BACKOFF_CAP = 30.0
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def _error_reason(resp: httpx.Response) -> str:
+    try:
+        return resp.json()["error"]["errors"][0]["reason"]
+    except Exception:
+        return ""
+
+
+def is_throttled(resp: httpx.Response) -> bool:
+    """Responses that mean "slow down" and are worth retrying"""
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return True
+    # 403 quotaExceeded is the daily quota: retrying won't help
+    return resp.status_code == 403 and _error_reason(resp) in RATE_LIMIT_REASONS
+
+
+def retry_delay(attempt: int, resp: httpx.Response = None) -> float:
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_CAP)
+    # "Equal jitter": half fixed, half random, so retries from many tasks spread out
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class HostController:
+    def __init__(self, host: str, initial: int = INITIAL_LIMIT,
+                 min_limit: int = MIN_LIMIT, max_limit: int = MAX_LIMIT):
+        self.host = host
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self._window = 0
+        self._last_decrease = 0.0
+        self._min_latency = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters = []
+        self.stats = {
+            "requests": 0, "successes": 0, "throttled": 0,
+            "errors": 0, "retries": 0, "latency_total": 0.0,
+        }
+
+    # ── Slots ──────────────────────────────────────────────────
+
+    def _try_acquire(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.stats["requests"] += 1
+            return True
+        return False
+
+    def _wake_waiters(self):
+        """Caller holds the lock"""
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while not self._try_acquire():
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    break
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+        try:
+            yield
+        finally:
+            self._release()
+
+    # ── Feedback ──────────────────────────────────────────────────
+
+    def on_success(self, latency: float):
+        with self._lock:
+            self.stats["successes"] += 1
+            self.stats["latency_total"] += latency
+            if self._min_latency is None or latency < self._min_latency:
+                self._min_latency = latency
+            if latency > LATENCY_TOLERANCE * self._min_latency:
+                return
+            self._window += 1
+            if self._window >= self.limit and self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self._window = 0
+                self._wake_waiters()
+
+    def on_throttle(self):
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._decrease()
+
+    def on_error(self):
+        with self._lock:
+            self.stats["errors"] += 1
+            self._decrease()
+
+    def on_retry(self):
+        with self._lock:
+            self.stats["retries"] += 1
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+            self._last_decrease = now
+        self._window = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            successes = self.stats["successes"]
+            return {
+                "host": self.host,
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                **{k: v for k, v in self.stats.items() if k != "latency_total"},
+                "avg_latency_ms": round(self.stats["latency_total"] / successes * 1000, 1) if successes else None,
+            }
+
+
+class RequestPacer:
+    """Spaces requests at most 1/rate seconds apart, shared across threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(host: str, max_limit: int = MAX_LIMIT) -> HostController:
+    """
+    max_limit only applies when the host's controller is first created; callers
+    pass their connection pool size, since slots beyond it would just queue
+    inside the pool where latency-based backoff can't see it
+    """
+    with _controllers_lock:
+        if host not in _controllers:
+            _controllers[host] = HostController(host, max_limit=max_limit)
+        return _controllers[host]
+
+
+def host_stats() -> list[dict]:
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return [c.snapshot() for c in controllers]
@@ -0,0 +1,123 @@
+"""
+On-disk cache for YouTube Data API responses.
+
+Entries are keyed by endpoint + normalized params (API key excluded) and
+stored as one JSON file each under CACHE_DIR. Fresh entries (younger than
+the endpoint's TTL) are served without touching the network; stale ones are
+revalidated with If-None-Match so an unchanged resource costs a 304 instead
+of a full body. In replay-only mode nothing is sent at all, which lets the
+pipeline re-run offline from a previous crawl.
+
+Comment pages (TTL 0, single-use pageTokens) are only written to disk while
+recording (YOUTUBE_RECORD=1); otherwise every crawl would leave a new set of
+files behind that is never read again.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+CACHE_DIR = os.path.join(".cache", "http")
+
+# Seconds an entry is served without revalidation; 0 = always revalidate
+CACHE_TTLS = {
+    "search":         24 * 3600,
+    "videos":         6 * 3600,
+    "commentThreads": 0,
+    "comments":       0,
+}
+
+_replay_only = os.environ.get("YOUTUBE_REPLAY_ONLY") == "1"
+_record = os.environ.get("YOUTUBE_RECORD") == "1"
+
+
+class CacheMissError(RuntimeError):
+    pass
+
+
+def set_replay_only(enabled: bool):
+    global _replay_only
+    _replay_only = enabled
+
+
+def replay_only() -> bool:
+    return _replay_only
+
+
+def set_record(enabled: bool):
+    """Also keep TTL-0 responses, so a later replay-only run can serve them"""
+    global _record
+    _record = enabled
+
+
+def use_api_base(base: str):
+    """
+    Switches to a cache directory of its own for a non-default API base, so
+    responses from a local stand-in never get replayed against the real API
+    """
+    global CACHE_DIR
+    digest = hashlib.sha256(base.encode("utf-8")).hexdigest()[:12]
+    CACHE_DIR = os.path.join(".cache", f"http-{digest}")
+
+
+def _cache_path(endpoint: str, params: dict) -> str:
+    normalized = json.dumps(
+        {k: str(v) for k, v in params.items() if k != "key"}, sort_keys=True
+    )
+    digest = hashlib.sha256(f"{endpoint}?{normalized}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, endpoint, f"{digest}.json")
+
+
+def lookup(endpoint: str, params: dict):
+    """Returns the cached entry or None"""
+    path = _cache_path(endpoint, params)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(entry: dict) -> bool:
+    ttl = CACHE_TTLS.get(entry["endpoint"], 0)
+    return time.time() - entry["fetched_at"] < ttl
+
+
+def store(endpoint: str, params: dict, body: dict, etag: str = None):
+    """
+    Write-then-rename so readers never see a partial file. Failures are logged
+    and swallowed: the response is already in hand, the cache is best-effort
+    """
+    if not _record and CACHE_TTLS.get(endpoint, 0) == 0:
+        return
+    path = _cache_path(endpoint, params)
+    entry = {
+        "endpoint":   endpoint,
+        "params":     {k: v for k, v in params.items() if k != "key"},
+        "etag":       etag or body.get("etag"),
+        "fetched_at": time.time(),
+        "body":       body,
+    }
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per call, so threads / tasks writing the same key don't share a temp file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"  [Cache] Failed to write {endpoint} entry: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def touch(endpoint: str, params: dict, entry: dict):
+    """Resource revalidated (304): keep the body, restart its TTL"""
+    store(endpoint, params, entry["body"], entry.get("etag"))
+
+
+def clear():
+    import shutil
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
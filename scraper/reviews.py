@@ -1,10 +1,19 @@
 import httpx
+import math
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from scraper import rate_control
 from storage.models import Review
 
 
 REVIEW_API_URL = "https://www.tiktok.com/api/shop/pdp_desktop/get_product_reviews?"
+REVIEW_API_HOST = "www.tiktok.com"
+
+# 依次尝试的 page_size，接口会把超出上限的值截断，以第一页实际返回条数为准
+PAGE_SIZES = (50, 20, 10)
+MAX_REQUESTS_PER_SECOND = 4.0   # 请求速率预算
+MAX_WORKERS = 4                 # 并发页数上限（实际并发再由 rate_control 按延迟/错误自适应收缩）
 
 # 基础 Headers，从你的抓包直接复制
 BASE_HEADERS = {
@@ -22,58 +31,223 @@ BASE_HEADERS = {
 
 
 class ReviewScraper:
-    def __init__(self, cookies: dict):
+    def __init__(self, cookies: dict, max_rps: float = MAX_REQUESTS_PER_SECOND,
+                 max_workers: int = MAX_WORKERS):
         """
         cookies: 通过 CookieManager 从 Playwright 获取的登录态 cookies
+        max_rps: 每秒最多发出的请求数，所有并发页共享
         """
         self.cookies = cookies
+        self.max_workers = max_workers
+        self.pacer = rate_control.RequestPacer(max_rps)
+        self.controller = rate_control.get_controller(REVIEW_API_HOST)
+        self.page_size = None       # 接口实际接受的最大 page_size，首次请求时探测
+        self._client = None
+
+    # ── 连接 ──────────────────────────────────────────────────
+
+    @property
+    def client(self) -> httpx.Client:
+        """所有页、所有商品共用一个连接池，复用 keep-alive 连接"""
+        if self._client is None:
+            self._client = httpx.Client(
+                headers=BASE_HEADERS, cookies=self.cookies, timeout=15,
+                limits=httpx.Limits(max_connections=self.max_workers * 2),
+            )
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ── 单页请求 ──────────────────────────────────────────────────
+
+    def _fetch_page(self, product_id: str, page_start: int, page_size: int) -> dict | None:
+        """
+        拉取一页，429 / 5xx / 网络错误按指数退避重试
+        返回接口 data 字段；失败返回 None
+        """
+        payload = {
+            "product_id":     product_id,
+            "page_start":     page_start,
+            "page_size":      page_size,
+            "sort_rule":      1,
+            "component_name": "pdp_left_reviews",
+            "review_filter":  {"filter_type": 1, "filter_value": 6},
+        }
+
+        for attempt in range(rate_control.MAX_RETRIES + 1):
+            resp, error = None, None
+            with self.controller.slot():
+                self.pacer.wait()
+                start = time.monotonic()
+                try:
+                    resp = self.client.post(REVIEW_API_URL, json=payload)
+                except httpx.TransportError as e:
+                    error = e
+
+            if error is None and not rate_control.is_throttled(resp):
+                break
+            if error is not None:
+                self.controller.on_error()
+            else:
+                self.controller.on_throttle()
+            if attempt == rate_control.MAX_RETRIES:
+                print(f"[ReviewScraper] 请求失败 page={page_start}，已重试 {attempt} 次: "
+                      f"{error or resp.status_code}")
+                return None
+            self.controller.on_retry()
+            time.sleep(rate_control.retry_delay(attempt, resp))
+
+        try:
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            print(f"[ReviewScraper] 请求失败 page={page_start}: {e}")
+            return None
+        self.controller.on_success(time.monotonic() - start)
+
+        if data.get("code") != 0:
+            print(f"[ReviewScraper] API 返回错误 page={page_start}: {data.get('message')}")
+            return None
+        return data.get("data", {})
+
+    def _first_page(self, product_id: str) -> tuple[dict | None, int]:
+        """
+        第一页顺序请求，同时确定 page_size：
+        从大到小尝试 PAGE_SIZES，接口截断时以实际返回条数为准
+        """
+        sizes = (self.page_size,) if self.page_size else PAGE_SIZES
+        for size in sizes:
+            data = self._fetch_page(product_id, 1, size)
+            if data is None:
+                continue
+            returned = len(data.get("product_reviews", []))
+            if data.get("has_more") and 0 < returned < size:
+                size = returned
+            self.page_size = size
+            return data, size
+        return None, PAGE_SIZES[-1]
+
+    # ── 分页抓取 ──────────────────────────────────────────────────
 
     def fetch_reviews(self, product_id: str, max_count: int = 200) -> list[Review]:
-        """分页拉取指定商品的所有评论"""
-        reviews = []
-        page_start = 1
-        page_size = 10
-
-        with httpx.Client(headers=BASE_HEADERS, cookies=self.cookies, timeout=15) as client:
-            while len(reviews) < max_count:
-                payload = {
-                    "product_id":     product_id,
-                    "page_start":     page_start,
-                    "page_size":      page_size,
-                    "sort_rule":      1,
-                    "component_name": "pdp_left_reviews",
-                    "review_filter":  {"filter_type": 1, "filter_value": 6},
+        """
+        拉取指定商品的评论，最多 max_count 条
+        第一页确定 page_size 和 has_more 后，其余页并发请求，
+        速率由 pacer（每秒请求数）和 controller（按延迟/错误自适应的并发数）共同控制
+        """
+        data, page_size = self._first_page(product_id)
+        if data is None:
+            return []
+
+        pages = {1: self._parse_reviews(product_id, {"data": data})}
+        if not pages[1]:
+            print("[ReviewScraper] 第 1 页无数据，停止")
+            return []
+
+        last_page = math.ceil(max_count / page_size)
+        if not data.get("has_more", False):
+            last_page = 1
+
+        if last_page > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {
+                    pool.submit(self._fetch_page, product_id, page, page_size): page
+                    for page in range(2, last_page + 1)
                 }
+                for future in as_completed(futures):
+                    page = futures[future]
+                    if future.cancelled():
+                        continue
+                    result = future.result()
+                    if result is None:
+                        continue
+                    batch = self._parse_reviews(product_id, {"data": result})
+                    if batch:
+                        pages[page] = batch
+                    if not batch or not result.get("has_more", False):
+                        # 之后的页都是空的，取消还没发出的请求
+                        last_page = min(last_page, page if batch else page - 1)
+                        for f, p in futures.items():
+                            if p > last_page:
+                                f.cancel()
 
-                try:
-                    resp = client.post(REVIEW_API_URL, json=payload)
-                    resp.raise_for_status()
-                    data = resp.json()
-                except Exception as e:
-                    print(f"[ReviewScraper] 请求失败 page={page_start}: {e}")
-                    break
+        reviews = []
+        seen = set()
+        for page in sorted(pages):
+            if page > last_page:
+                break
+            for review in pages[page]:
+                if review.review_id not in seen:
+                    seen.add(review.review_id)
+                    reviews.append(review)
 
-                if data.get("code") != 0:
-                    print(f"[ReviewScraper] API 返回错误: {data.get('message')}")
-                    break
+        missing = [p for p in range(1, last_page + 1) if p not in pages]
+        if missing:
+            print(f"[ReviewScraper] 第 {missing} 页抓取失败")
+        reviews = reviews[:max_count]
+        print(f"[ReviewScraper] 已抓取 {len(reviews)} 条评论（{len(pages)} 页，page_size={page_size}）")
+        return reviews
 
-                batch = self._parse_reviews(product_id, data)
-                if not batch:
-                    print(f"[ReviewScraper] 第 {page_start} 页无数据，停止")
-                    break
+    def fetch_new_reviews(self, product_id: str, known_ids: set[str],
+                          max_count: int = 200) -> list[Review]:
+        """
+        增量抓取：sort_rule=1 按时间倒序返回，碰到已存储的 review_id 就停，只返回更新的评论
+        第一页之后每批并发 max_workers 页，一批里出现已知评论就不再请求下一批
+        有页面重试后仍失败时抛 RuntimeError，调用方这一轮什么都不存
+        """
+        data, page_size = self._first_page(product_id)
+        if data is None:
+            return []
 
-                reviews.extend(batch)
-                print(f"[ReviewScraper] 已抓取 {len(reviews)} 条评论")
+        new_reviews = []
+        seen = set()
+        last_page = math.ceil(max_count / page_size)
+        wave = [(1, data)]
+        next_page = 2
+        reached_known = False
 
-                # 检查是否还有更多页
-                if not data.get("data", {}).get("has_more", False):
-                    print("[ReviewScraper] 已到最后一页")
-                    break
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                finished = False
+                for page, result in wave:
+                    if result is None:
+                        # 不能跳过：后面页的评论一旦存下，下次增量会停在它们上面，这一页就永远补不回来
+                        # 连前面的页也不返回，整轮不存，下次从第一页重来
+                        raise RuntimeError(f"第 {page} 页重试后仍抓取失败，本轮增量放弃")
+                    batch = self._parse_reviews(product_id, {"data": result})
+                    for review in batch:
+                        if review.review_id in known_ids:
+                            reached_known = True
+                            break
+                        if review.review_id not in seen:
+                            seen.add(review.review_id)
+                            new_reviews.append(review)
+                    if reached_known or not batch or not result.get("has_more", False):
+                        finished = True
+                        break
 
-                page_start += 1
-                time.sleep(1.5)  # 避免触发限速
+                if finished or next_page > last_page or len(new_reviews) >= max_count:
+                    break
+                pages = list(range(next_page, min(next_page + self.max_workers, last_page + 1)))
+                wave = list(zip(pages, pool.map(
+                    lambda p: self._fetch_page(product_id, p, page_size), pages
+                )))
+                next_page = pages[-1] + 1
 
-        return reviews[:max_count]
+        if reached_known:
+            print(f"[ReviewScraper] 碰到已存储的评论，增量 {len(new_reviews)} 条")
+        else:
+            print(f"[ReviewScraper] 未碰到已存储的评论，共抓取 {len(new_reviews)} 条")
+        return new_reviews[:max_count]
 
     def _parse_reviews(self, product_id: str, raw_data: dict) -> list[Review]:
         reviews = []
@@ -1,25 +1,18 @@
-import httpx
-from config import YOUTUBE_API_KEY
+from scraper.http_client import api_get
 from storage.models import Video
 
-SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
-VIDEO_URL  = "https://www.googleapis.com/youtube/v3/videos"
-
 class VideoSearcher:
     def search(self, keyword: str, max_results: int = 2) -> list[Video]:
         print(f"[VideoSearcher] 搜索: '{keyword} review'")
 
         # 第一步：搜索视频，拿到 video_id 列表
-        resp = httpx.get(SEARCH_URL, params={
-            "key":        YOUTUBE_API_KEY,
+        items = api_get("search", {
             "q":          f"{keyword} review",
             "part":       "snippet",
             "type":       "video",
             "maxResults": max_results,
             "relevanceLanguage": "en",
-        })
-        resp.raise_for_status()
-        items = resp.json().get("items", [])
+        }).get("items", [])
 
         if not items:
             print("[VideoSearcher] 未找到视频")
@@ -28,13 +21,10 @@ class VideoSearcher:
         video_ids = [item["id"]["videoId"] for item in items]
 
         # 第二步：拿播放量/点赞/评论数等统计数据
-        stats_resp = httpx.get(VIDEO_URL, params={
-            "key":  YOUTUBE_API_KEY,
+        stats_items = api_get("videos", {
             "id":   ",".join(video_ids),
             "part": "snippet,statistics",
-        })
-        stats_resp.raise_for_status()
-        stats_items = stats_resp.json().get("items", [])
+        }).get("items", [])
 
         videos = []
         for item in stats_items:
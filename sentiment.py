@@ -1,5 +1,13 @@
+import threading
+
 from transformers import pipeline
 
+INFERENCE_WORKERS = 1       # Concurrent model calls per process (CPU-bound, one shared pipeline)
+SENTIMENT_BATCH_SIZE = 64   # Comments per analyze_batch call in the streaming paths
+
+# Held around analyze_batch by every caller (YouTube comments and shop reviews alike)
+inference_slots = threading.BoundedSemaphore(INFERENCE_WORKERS)
+
 # First run will auto-download model (~250MB), then use local cache
 _pipeline = None
 
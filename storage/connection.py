@@ -0,0 +1,117 @@
+"""
+SQLite 连接管理：每个线程一条长连接，WAL 日志模式 + 调优过的 pragma。
+
+所有存储函数都通过 transaction() 访问数据库:
+    with transaction() as conn:                 # 写：BEGIN IMMEDIATE，提前拿写锁
+        conn.execute("INSERT ...")
+    with transaction(readonly=True) as conn:    # 读：同一个快照里执行多条查询
+        rows = conn.execute("SELECT ...").fetchall()
+
+WAL 模式下读不阻塞写、写不阻塞读，Flask 并发请求不再在文件锁上排队。
+嵌套调用会并入最外层事务，只有最外层负责 COMMIT / ROLLBACK。
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import DB_PATH
+
+# 环境变量可临时指向另一个库（如对 mock_youtube_server 压测），不动 config.py
+DB_PATH = os.environ.get("AAI_DB_PATH", DB_PATH)
+
+BUSY_TIMEOUT = 30           # 秒，等待其他连接释放写锁的上限
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous":  "NORMAL",      # WAL 下 NORMAL 不会损坏数据库，只可能丢最后几个事务
+    "cache_size":   -64000,        # 负数单位为 KiB，即每条连接 64MB 页缓存
+    "mmap_size":    268435456,     # 256MB 内存映射读
+    "temp_store":   "MEMORY",
+}
+
+_local = threading.local()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # isolation_level=None：由 transaction() 显式 BEGIN，而不是 sqlite3 模块隐式开事务
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """当前线程的长连接，第一次调用时创建"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        _local.conn = conn = _connect(DB_PATH)
+        _local.path = DB_PATH
+        _local.depth = 0
+    return conn
+
+
+@contextmanager
+def transaction(readonly: bool = False):
+    conn = get_connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+
+    conn.execute("BEGIN" if readonly else "BEGIN IMMEDIATE")
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        _local.depth = 0
+
+
+@contextmanager
+def read_connection():
+    """
+    当前线程的只读长连接，和写连接分开，给边读边写的流式查询用：
+    游标可以跨多次 yield 保持打开，同一线程里的写入不会并进这次读。
+    调用方用完要 close() 游标，否则没读完的游标一直占着读快照。
+    外层的流还没读完时嵌套调用拿到一条临时连接，免得共用外层的旧快照
+    """
+    depth = getattr(_local, "read_depth", 0)
+    if depth:
+        conn = _connect(DB_PATH)
+        conn.execute("PRAGMA query_only = 1")
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    conn = getattr(_local, "read_conn", None)
+    if conn is None or _local.read_path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        _local.read_conn = conn = _connect(DB_PATH)
+        _local.read_path = DB_PATH
+        conn.execute("PRAGMA query_only = 1")
+    _local.read_depth = 1
+    try:
+        yield conn
+    finally:
+        _local.read_depth = 0
+
+
+def close_connection():
+    """关闭当前线程的读写连接（线程结束时连接也会随 thread-local 一起释放）"""
+    for name in ("conn", "read_conn"):
+        conn = getattr(_local, name, None)
+        if conn is not None:
+            conn.close()
+            setattr(_local, name, None)
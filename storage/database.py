@@ -1,36 +1,190 @@
+import json
 import sqlite3
-from config import DB_PATH
-from storage.models import Video, Comment
+from storage.connection import transaction, get_connection, read_connection
+from storage.models import Video, Comment, Product, Review
+
+# 对应的查询：get_all_comments / get_comments_by_sentiment / get_replies / get_comments + get_sync_state
+# reviews：按商品、时间倒序（get_reviews / get_known_review_ids）
+INDEXES = [
+    """CREATE INDEX IF NOT EXISTS idx_comments_thread
+       ON comments (video_id, thread_root, parent_id, created_at)""",
+    """CREATE INDEX IF NOT EXISTS idx_comments_sentiment
+       ON comments (video_id, sentiment_label, sentiment_score DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_comments_parent
+       ON comments (parent_id, created_at)""",
+    """CREATE INDEX IF NOT EXISTS idx_comments_top
+       ON comments (video_id, parent_id, created_at)""",
+    """CREATE INDEX IF NOT EXISTS idx_reviews_product
+       ON reviews (product_id, created_at)""",
+]
+
+
+# id 是 rowid 的别名：显式的 INTEGER PRIMARY KEY 在 VACUUM 后不会被重新编号，
+# 全文索引 comments_fts 靠它对应到评论（TEXT 主键的表 rowid 不稳定）
+COMMENTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id              INTEGER PRIMARY KEY,
+        comment_id      TEXT NOT NULL UNIQUE,
+        video_id        TEXT,
+        parent_id       TEXT,
+        thread_root     TEXT,               -- COALESCE(parent_id, comment_id)，所属顶层评论
+        username        TEXT,
+        text            TEXT,
+        like_count      INTEGER DEFAULT 0,
+        reply_count     INTEGER DEFAULT 0,
+        created_at      TIMESTAMP,
+        fetched_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        clean_text      TEXT,               -- preprocess 后的文本
+        sentiment_label TEXT,               -- positive/negative/neutral
+        sentiment_score REAL,               -- 置信度 0-1
+        FOREIGN KEY (video_id) REFERENCES videos(video_id)
+    );
+"""
+
+
+# clean_text 的全文索引（external content，不重复存文本），由触发器与 comments 同步
+FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+        clean_text,
+        content='comments', content_rowid='id',
+        tokenize='porter unicode61'
+    );
+    CREATE TRIGGER IF NOT EXISTS comments_fts_ai AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts (rowid, clean_text)
+        SELECT new.id, new.clean_text WHERE new.clean_text IS NOT NULL;
+    END;
+    CREATE TRIGGER IF NOT EXISTS comments_fts_ad AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, clean_text)
+        SELECT 'delete', old.id, old.clean_text WHERE old.clean_text IS NOT NULL;
+    END;
+    CREATE TRIGGER IF NOT EXISTS comments_fts_au AFTER UPDATE OF clean_text ON comments BEGIN
+        INSERT INTO comments_fts (comments_fts, rowid, clean_text)
+        SELECT 'delete', old.id, old.clean_text WHERE old.clean_text IS NOT NULL;
+        INSERT INTO comments_fts (rowid, clean_text)
+        SELECT new.id, new.clean_text WHERE new.clean_text IS NOT NULL;
+    END;
+"""
+
+
+# preprocess 过滤掉的评论（太短 / 垃圾 / 无文字）：clean_text 置空并打上这个标签，
+# 让它们离开“未分析”队列；所有情感统计都不计入
+SKIPPED_LABEL = "skipped"
+
+
+# 每个视频、每种情感的汇总：条数、点赞加权分 (1 + LIKE_WEIGHT * like_count) * score、分数和
+# 由触发器随 comments 增量维护（save_sentiment 写标签、save_comments 改点赞数都会触发），
+# get_sentiment_summary / get_sentiment_aggregates 只读几行，不再扫描评论
+LIKE_WEIGHT = 0.05
+
+
+def _aggregate_delta(row: str, sign: int) -> str:
+    """把 new / old 这一行的贡献加到（sign=1）或减出（sign=-1）sentiment_aggregates"""
+    return f"""
+        INSERT INTO sentiment_aggregates
+            (video_id, sentiment_label, comment_count, weighted_sum, score_sum)
+        SELECT {row}.video_id, {row}.sentiment_label, {sign},
+               {sign} * (1 + {LIKE_WEIGHT} * COALESCE({row}.like_count, 0))
+                      * COALESCE({row}.sentiment_score, 0),
+               {sign} * COALESCE({row}.sentiment_score, 0)
+        WHERE {row}.sentiment_label IS NOT NULL AND {row}.sentiment_label != '{SKIPPED_LABEL}'
+        ON CONFLICT (video_id, sentiment_label) DO UPDATE SET
+            comment_count = comment_count + excluded.comment_count,
+            weighted_sum  = weighted_sum  + excluded.weighted_sum,
+            score_sum     = score_sum     + excluded.score_sum;"""
+
+
+AGGREGATE_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS sentiment_aggregates (
+        video_id        TEXT,
+        sentiment_label TEXT,
+        comment_count   INTEGER NOT NULL DEFAULT 0,
+        weighted_sum    REAL    NOT NULL DEFAULT 0,
+        score_sum       REAL    NOT NULL DEFAULT 0,
+        PRIMARY KEY (video_id, sentiment_label)
+    ) WITHOUT ROWID;
+    -- 触发器每次启动都重建，旧库也能用上最新的定义
+    DROP TRIGGER IF EXISTS comments_agg_ai;
+    DROP TRIGGER IF EXISTS comments_agg_ad;
+    DROP TRIGGER IF EXISTS comments_agg_au;
+    CREATE TRIGGER comments_agg_ai AFTER INSERT ON comments BEGIN
+        {_aggregate_delta("new", 1)}
+    END;
+    CREATE TRIGGER comments_agg_ad AFTER DELETE ON comments BEGIN
+        {_aggregate_delta("old", -1)}
+    END;
+    CREATE TRIGGER comments_agg_au
+    AFTER UPDATE OF video_id, sentiment_label, sentiment_score, like_count ON comments BEGIN
+        {_aggregate_delta("old", -1)}
+        {_aggregate_delta("new", 1)}
+    END;
+"""
 
 def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS videos (
-                video_id      TEXT PRIMARY KEY,
-                author        TEXT,
-                description   TEXT,
-                view_count    INTEGER DEFAULT 0,
-                like_count    INTEGER DEFAULT 0,
-                comment_count INTEGER DEFAULT 0,
-                fetched_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            CREATE TABLE IF NOT EXISTS comments (
-                comment_id      TEXT PRIMARY KEY,
-                video_id        TEXT,
-                parent_id       TEXT,
-                username        TEXT,
-                text            TEXT,
-                like_count      INTEGER DEFAULT 0,
-                reply_count     INTEGER DEFAULT 0,
-                created_at      TIMESTAMP,
-                fetched_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                clean_text      TEXT,               -- preprocess 后的文本
-                sentiment_label TEXT,               -- positive/negative/neutral
-                sentiment_score REAL,               -- 置信度 0-1
-                FOREIGN KEY (video_id) REFERENCES videos(video_id)
-            );
-        """)
+    # executescript 会先提交当前事务，所以建表在事务外执行（都是 IF NOT EXISTS，可重复执行）
+    get_connection().executescript("""
+        CREATE TABLE IF NOT EXISTS videos (
+            video_id      TEXT PRIMARY KEY,
+            author        TEXT,
+            description   TEXT,
+            view_count    INTEGER DEFAULT 0,
+            like_count    INTEGER DEFAULT 0,
+            comment_count INTEGER DEFAULT 0,
+            fetched_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """ + COMMENTS_TABLE.format(name="comments") + """
+        CREATE TABLE IF NOT EXISTS api_quota (
+            quota_day  TEXT,                    -- 配额日（太平洋时间，与 YouTube 重置时间一致）
+            endpoint   TEXT,                    -- search / videos / commentThreads / comments
+            calls      INTEGER DEFAULT 0,
+            units      INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (quota_day, endpoint)
+        );
+        CREATE TABLE IF NOT EXISTS transcripts (
+            video_id     TEXT PRIMARY KEY,
+            language     TEXT,                  -- 字幕语言代码，如 en / en-US / de
+            is_generated INTEGER DEFAULT 0,     -- 1 = YouTube 自动生成的字幕
+            transcript   TEXT,
+            segments     TEXT,                  -- JSON: [{text, start, duration}]
+            fetched_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (video_id) REFERENCES videos(video_id)
+        );
+        CREATE TABLE IF NOT EXISTS search_cache (
+            keyword    TEXT PRIMARY KEY,        -- 归一化后的商品关键词
+            video_ids  TEXT,                    -- JSON 数组，按搜索排名
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            max_results INTEGER                 -- 搜索时请求的条数（结果可能更少）
+        );
+        CREATE TABLE IF NOT EXISTS watched_products (
+            product_id  TEXT PRIMARY KEY,       -- TikTok Shop 商品 ID
+            added_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_run_at TIMESTAMP,
+            last_status TEXT                    -- ok / error: ...
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            product_id  TEXT PRIMARY KEY,       -- TikTok Shop 商品 ID
+            name        TEXT,
+            shop_name   TEXT,
+            price       REAL,
+            fetched_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS reviews (
+            review_id       TEXT PRIMARY KEY,
+            product_id      TEXT,
+            username        TEXT,
+            rating          INTEGER,
+            content         TEXT,
+            helpful_cnt     INTEGER DEFAULT 0,
+            created_at      TIMESTAMP,
+            fetched_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            clean_text      TEXT,               -- preprocess 后的文本
+            sentiment_label TEXT,               -- positive/negative/neutral
+            sentiment_score REAL,               -- 置信度 0-1
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        );
+    """)
 
+    with transaction() as conn:
         # 自动迁移：旧表补列
         existing = [
             row[1] for row in
@@ -41,13 +195,119 @@ def init_db():
             ("clean_text",      "TEXT"),
             ("sentiment_label", "TEXT"),
             ("sentiment_score", "REAL"),
+            ("thread_root",     "TEXT"),
         ]:
             if col not in existing:
                 conn.execute(f"ALTER TABLE comments ADD COLUMN {col} {col_type}")
                 print(f"[DB] 已自动添加 {col} 列")
 
+        existing_search_cols = [
+            row[1] for row in
+            conn.execute("PRAGMA table_info(search_cache)").fetchall()
+        ]
+        if "max_results" not in existing_search_cols:
+            conn.execute("ALTER TABLE search_cache ADD COLUMN max_results INTEGER")
+            print("[DB] search_cache 已自动添加 max_results 列")
+
+        existing_review_cols = [
+            row[1] for row in
+            conn.execute("PRAGMA table_info(reviews)").fetchall()
+        ]
+        for col, col_type in [
+            ("clean_text",      "TEXT"),
+            ("sentiment_label", "TEXT"),
+            ("sentiment_score", "REAL"),
+        ]:
+            if col not in existing_review_cols:
+                conn.execute(f"ALTER TABLE reviews ADD COLUMN {col} {col_type}")
+                print(f"[DB] reviews 已自动添加 {col} 列")
+
+        # 旧数据补 thread_root（新写入的由 save_comments 填）
+        if "thread_root" not in existing:
+            backfilled = conn.execute("""
+                UPDATE comments SET thread_root = COALESCE(parent_id, comment_id)
+            """).rowcount
+            print(f"[DB] 已为 {backfilled} 条评论补充 thread_root")
+
+        # 旧表以 TEXT comment_id 为主键、没有 id 列：重建成带 INTEGER PRIMARY KEY 的表
+        # id 沿用旧 rowid；表上的触发器和索引随旧表一起删除，下面和 _init_fts 里重建
+        rebuilt = "id" not in existing
+        if rebuilt:
+            columns = ", ".join(
+                row[1] for row in conn.execute("PRAGMA table_info(comments)").fetchall()
+            )
+            conn.execute(COMMENTS_TABLE.format(name="comments_rebuild"))
+            copied = conn.execute(f"""
+                INSERT INTO comments_rebuild (id, {columns})
+                SELECT rowid, {columns} FROM comments
+            """).rowcount
+            conn.execute("DROP TABLE comments")
+            conn.execute("ALTER TABLE comments_rebuild RENAME TO comments")
+            print(f"[DB] comments 已重建为 INTEGER 主键（{copied} 条）")
+
+        # 索引依赖上面补的列，所以放在迁移之后建
+        for statement in INDEXES:
+            conn.execute(statement)
+
+    # 触发器引用 clean_text / sentiment_* 列，必须在补列之后建
+    _init_fts(rebuild=rebuilt)
+    _init_sentiment_aggregates()
+
+def _init_fts(rebuild: bool = False):
+    """
+    建全文索引；旧库第一次建索引时把已分析的评论补进去。SQLite 没编译 FTS5 时跳过
+    rebuild=True 时按 comments 全量重建索引（comments 表被重建过，或做过别的批量维护之后）
+    """
+    conn = get_connection()
+    is_new = conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE name = 'comments_fts'
+    """).fetchone() is None
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError as e:
+        print(f"[DB] 全文索引不可用，search_comments 将无法使用: {e}")
+        return
+    if is_new:
+        with transaction() as conn:
+            indexed = conn.execute("""
+                INSERT INTO comments_fts (rowid, clean_text)
+                SELECT id, clean_text FROM comments WHERE clean_text IS NOT NULL
+            """).rowcount
+        if indexed:
+            print(f"[DB] 已为 {indexed} 条评论建立全文索引")
+    elif rebuild:
+        rebuild_search_index()
+
+
+def rebuild_search_index():
+    """按 comments 的当前内容重建全文索引"""
+    with transaction() as conn:
+        conn.execute("INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')")
+    print("[DB] 已重建全文索引")
+
+def _init_sentiment_aggregates():
+    """建汇总表和触发器；第一次建表时按现有评论一次性算出汇总"""
+    conn = get_connection()
+    is_new = conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE name = 'sentiment_aggregates'
+    """).fetchone() is None
+    conn.executescript(AGGREGATE_SCHEMA)
+    if is_new:
+        with transaction() as conn:
+            conn.execute(f"""
+                INSERT INTO sentiment_aggregates
+                    (video_id, sentiment_label, comment_count, weighted_sum, score_sum)
+                SELECT video_id, sentiment_label, COUNT(*),
+                       SUM((1 + {LIKE_WEIGHT} * COALESCE(like_count, 0))
+                           * COALESCE(sentiment_score, 0)),
+                       SUM(COALESCE(sentiment_score, 0))
+                FROM comments
+                WHERE sentiment_label IS NOT NULL AND sentiment_label != ?
+                GROUP BY video_id, sentiment_label
+            """, (SKIPPED_LABEL,))
+
 def save_video(video: Video):
-    with sqlite3.connect(DB_PATH) as conn:
+    with transaction() as conn:
         conn.execute("""
             INSERT OR REPLACE INTO videos
                 (video_id, author, description, view_count, like_count, comment_count)
@@ -55,19 +315,74 @@ def save_video(video: Video):
         """, (video.video_id, video.author, video.description,
               video.view_count, video.like_count, video.comment_count))
 
-def save_comments(comments: list[Comment]):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.executemany("""
-            INSERT OR IGNORE INTO comments
-                (comment_id, video_id, parent_id, username, text,
+def save_comments(comments: list[Comment]) -> dict:
+    """
+    批量 upsert：新评论插入；已存在的评论只在点赞数 / 回复数变化时才写
+    返回 {"inserted": n, "updated": n, "unchanged": n}
+    """
+    rows = {c.comment_id: c for c in comments}     # 同一批里重复的 id 以最后一条为准
+    if not rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    with transaction() as conn:
+        existing = conn.execute("""
+            SELECT COUNT(*) FROM comments
+            WHERE comment_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(rows)),)).fetchone()[0]
+        # rowcount 只计入真正写入的行：新插入的 + 指标有变化的
+        written = conn.executemany("""
+            INSERT INTO comments
+                (comment_id, video_id, parent_id, thread_root, username, text,
                  like_count, reply_count, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, [(c.comment_id, c.video_id, c.parent_id, c.username, c.text,
-               c.like_count, c.reply_count, c.created_at) for c in comments])
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (comment_id) DO UPDATE
+            SET like_count  = excluded.like_count,
+                reply_count = excluded.reply_count
+            WHERE like_count  IS NOT excluded.like_count
+               OR reply_count IS NOT excluded.reply_count
+        """, [(c.comment_id, c.video_id, c.parent_id, c.parent_id or c.comment_id,
+               c.username, c.text, c.like_count, c.reply_count, c.created_at)
+              for c in rows.values()]).rowcount
+
+    inserted = len(rows) - existing
+    updated = written - inserted
+    return {"inserted": inserted, "updated": updated, "unchanged": existing - updated}
+
+def get_sync_state(video_id: str) -> dict:
+    """
+    增量同步用：返回该视频已存储的最新评论时间、顶层评论 id → 已存储的回复数，
+    以及已存储的回复 id（回复数变多的热门楼层重抓回复时，用来去掉已存过的）
+    """
+    with transaction(readonly=True) as conn:
+        newest = conn.execute("""
+            SELECT comment_id, created_at FROM comments
+            WHERE video_id = ? AND parent_id IS NULL
+            ORDER BY created_at DESC
+            LIMIT 1
+        """, (video_id,)).fetchone()
+        rows = conn.execute("""
+            SELECT comment_id, reply_count FROM comments
+            WHERE video_id = ? AND parent_id IS NULL
+        """, (video_id,)).fetchall()
+        reply_ids = conn.execute("""
+            SELECT comment_id FROM comments
+            WHERE video_id = ? AND parent_id IS NOT NULL
+        """, (video_id,)).fetchall()
+
+    return {
+        "newest_comment_id": newest[0] if newest else None,
+        "newest_created_at": newest[1] if newest else None,
+        "reply_counts": {comment_id: reply_count or 0 for comment_id, reply_count in rows},
+        "reply_ids": {row[0] for row in reply_ids},
+    }
+
+def update_comment_metrics(comments: list[Comment]) -> dict:
+    """刷新已存储评论的点赞数 / 回复数（没变化的不写），返回值同 save_comments"""
+    return save_comments(comments)
 
 def save_sentiment(results: list[dict]):
-    """将 clean_text + sentiment_label + sentiment_score 写回 comments 表"""
-    with sqlite3.connect(DB_PATH) as conn:
+    """将 clean_text + sentiment_label + sentiment_score 写回 comments 表（sentiment_aggregates 由触发器同步更新）"""
+    with transaction() as conn:
         conn.executemany("""
             UPDATE comments
             SET clean_text      = ?,
@@ -77,26 +392,41 @@ def save_sentiment(results: list[dict]):
         """, [(r["clean_text"], r["sentiment_label"],
                r["sentiment_score"], r["comment_id"]) for r in results])
 
+def mark_comments_skipped(comment_ids: list[str]):
+    """preprocess 过滤掉的评论：不送模型，但标记为已处理，下次不再重新预处理"""
+    with transaction() as conn:
+        conn.executemany("""
+            UPDATE comments
+            SET clean_text = '', sentiment_label = ?, sentiment_score = NULL
+            WHERE comment_id = ?
+        """, [(SKIPPED_LABEL, comment_id) for comment_id in comment_ids])
+
 def get_sentiment_summary(video_id: str) -> dict:
     """返回这个视频的情感统计"""
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute("""
-            SELECT sentiment_label, COUNT(*) as cnt
-            FROM comments
-            WHERE video_id = ? AND sentiment_label IS NOT NULL
-            GROUP BY sentiment_label
-        """, (video_id,)).fetchall()
-
     summary = {"positive": 0, "negative": 0, "neutral": 0}
-    for label, cnt in rows:
-        summary[label] = cnt
+    for label, agg in get_sentiment_aggregates(video_id).items():
+        summary[label] = agg["count"]
     return summary
 
+def get_sentiment_aggregates(video_id: str) -> dict:
+    """
+    按情感标签的汇总，来自 sentiment_aggregates，不扫描评论
+    返回 {label: {"count", "weighted_sum", "score_sum"}}，没有评论的标签不出现
+    """
+    with transaction(readonly=True) as conn:
+        rows = conn.execute("""
+            SELECT sentiment_label, comment_count, weighted_sum, score_sum
+            FROM sentiment_aggregates
+            WHERE video_id = ? AND comment_count > 0
+        """, (video_id,)).fetchall()
+    return {
+        label: {"count": count, "weighted_sum": weighted, "score_sum": score}
+        for label, count, weighted, score in rows
+    }
 
 def get_comments_by_sentiment(video_id: str, label: str) -> list[dict]:
     """按情感标签查询评论，按置信度排序"""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with transaction(readonly=True) as conn:
         rows = conn.execute("""
             SELECT * FROM comments
             WHERE video_id = ? AND sentiment_label = ?
@@ -106,8 +436,7 @@ def get_comments_by_sentiment(video_id: str, label: str) -> list[dict]:
 
 def get_comments(video_id: str) -> list[dict]:
     """只返回顶层评论"""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with transaction(readonly=True) as conn:
         rows = conn.execute("""
             SELECT * FROM comments
             WHERE video_id = ? AND parent_id IS NULL
@@ -117,8 +446,7 @@ def get_comments(video_id: str) -> list[dict]:
 
 def get_replies(parent_id: str) -> list[dict]:
     """返回某条评论下的所有回复"""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with transaction(readonly=True) as conn:
         rows = conn.execute("""
             SELECT * FROM comments
             WHERE parent_id = ?
@@ -127,15 +455,375 @@ def get_replies(parent_id: str) -> list[dict]:
     return [dict(r) for r in rows]
 
 def get_all_comments(video_id: str) -> list[dict]:
-    """返回所有评论（含回复），按层级排列"""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    """返回所有评论（含回复），按层级排列；数据量大时用 iter_comments 流式读取"""
+    return list(iter_comments(video_id))
+
+
+# ── 流式读取 ──────────────────────────────────────────────────
+
+COMMENT_COLUMNS = {
+    "comment_id", "video_id", "parent_id", "thread_root", "username", "text",
+    "like_count", "reply_count", "created_at", "fetched_at",
+    "clean_text", "sentiment_label", "sentiment_score",
+}
+COMMENT_ORDERS = {
+    "thread": """thread_root,                      -- 把回复归到对应的顶层评论旁边
+                 parent_id,                        -- 顶层评论 parent_id 为 NULL，排在前面
+                 created_at ASC""",
+    "score":  "sentiment_score DESC",
+    "likes":  "like_count DESC",
+}
+STREAM_CHUNK_SIZE = 1000
+
+
+def iter_comment_chunks(video_id: str, columns: list[str] = None, top_level_only: bool = False,
+                        unanalyzed_only: bool = False, label: str = None, order: str = "thread",
+                        limit: int = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    按块流式读取评论，每次 yield 最多 chunk_size 条 dict，不会一次性把整个视频读进内存
+    columns: 只取这些列（默认全部）
+    top_level_only: 只要顶层评论；unanalyzed_only: 只要还没做情感分析的；label: 按情感标签过滤
+    order: thread（按层级）/ score（置信度降序）/ likes（点赞降序）
+    """
+    unknown = set(columns or []) - COMMENT_COLUMNS
+    if unknown:
+        raise ValueError(f"Unknown comment columns: {sorted(unknown)}")
+
+    where = ["video_id = ?"]
+    params = [video_id]
+    if top_level_only:
+        where.append("parent_id IS NULL")
+    if unanalyzed_only:
+        where.append("sentiment_label IS NULL")
+    if label is not None:
+        where.append("sentiment_label = ?")
+        params.append(label)
+
+    sql = f"""
+        SELECT {", ".join(columns) if columns else "*"} FROM comments
+        WHERE {" AND ".join(where)}
+        ORDER BY {COMMENT_ORDERS[order]}
+    """
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    with read_connection() as conn:
+        cursor = conn.execute(sql, params)
+        try:
+            while rows := cursor.fetchmany(chunk_size):
+                yield [dict(r) for r in rows]
+        finally:
+            cursor.close()      # 没读完就退出时释放读快照（连接是复用的）
+
+
+def iter_comments(video_id: str, **filters):
+    """iter_comment_chunks 的逐条版本，参数相同"""
+    for chunk in iter_comment_chunks(video_id, **filters):
+        yield from chunk
+
+
+def count_comments(video_id: str) -> dict:
+    """返回 {"top_level": 顶层评论数, "replies": 回复数}"""
+    with transaction(readonly=True) as conn:
+        row = conn.execute("""
+            SELECT COUNT(*) - COUNT(parent_id), COUNT(parent_id)
+            FROM comments
+            WHERE video_id = ?
+        """, (video_id,)).fetchone()
+    return {"top_level": row[0], "replies": row[1]}
+
+
+class SearchUnavailableError(RuntimeError):
+    pass
+
+
+def _fts_query(text: str) -> str:
+    """把用户输入转成 FTS5 查询：每个词加引号（避免语法错误），词之间是 AND"""
+    terms = [t for t in text.split() if t.strip('"')]
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def search_comments(query: str, video_ids: list[str] = None, label: str = None,
+                    page: int = 1, page_size: int = 20) -> dict:
+    """
+    在已分析评论的 clean_text 里全文搜索，按 bm25 相关度排序、分页
+    返回 {"query", "total", "page", "page_size", "results": [...]}，results 带情感和高亮片段
+    """
+    match = _fts_query(query)
+    if not match:
+        return {"query": query, "total": 0, "page": page, "page_size": page_size, "results": []}
+
+    where = ["comments_fts MATCH ?"]
+    params = [match]
+    if video_ids:
+        where.append(f"c.video_id IN ({', '.join('?' * len(video_ids))})")
+        params.extend(video_ids)
+    if label is not None:
+        where.append("c.sentiment_label = ?")
+        params.append(label)
+    where_sql = " AND ".join(where)
+
+    with transaction(readonly=True) as conn:
+        if conn.execute("""
+            SELECT 1 FROM sqlite_master WHERE name = 'comments_fts'
+        """).fetchone() is None:
+            raise SearchUnavailableError("全文索引不存在：这个 SQLite 没有编译 FTS5")
+        total = conn.execute(f"""
+            SELECT COUNT(*) FROM comments_fts
+            JOIN comments c ON c.id = comments_fts.rowid
+            WHERE {where_sql}
+        """, params).fetchone()[0]
+        rows = conn.execute(f"""
+            SELECT c.comment_id, c.video_id, c.parent_id, c.username, c.clean_text,
+                   c.like_count, c.created_at, c.sentiment_label, c.sentiment_score,
+                   snippet(comments_fts, 0, '[', ']', '…', 16) AS snippet,
+                   bm25(comments_fts) AS rank
+            FROM comments_fts
+            JOIN comments c ON c.id = comments_fts.rowid
+            WHERE {where_sql}
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        """, params + [page_size, (page - 1) * page_size]).fetchall()
+
+    return {
+        "query": query,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "results": [dict(r) for r in rows],
+    }
+
+
+def record_quota_usage(quota_day: str, endpoint: str, units: int, calls: int = 1):
+    """累加某个 endpoint 当天消耗的配额（calls 次请求共 units 个单位）"""
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO api_quota (quota_day, endpoint, calls, units)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (quota_day, endpoint) DO UPDATE
+            SET calls      = calls + excluded.calls,
+                units      = units + excluded.units,
+                updated_at = CURRENT_TIMESTAMP
+        """, (quota_day, endpoint, calls, units))
+
+
+def get_quota_usage(quota_day: str) -> dict:
+    """返回当天各 endpoint 已消耗的配额 {endpoint: units}"""
+    with transaction(readonly=True) as conn:
         rows = conn.execute("""
-            SELECT * FROM comments
+            SELECT endpoint, units FROM api_quota
+            WHERE quota_day = ?
+        """, (quota_day,)).fetchall()
+    return {endpoint: units for endpoint, units in rows}
+
+
+def save_search_result(keyword: str, video_ids: list[str], max_results: int):
+    """缓存关键词的搜索结果（keyword 需先归一化），同时记下请求的条数"""
+    with transaction() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO search_cache (keyword, video_ids, fetched_at, max_results)
+            VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+        """, (keyword, json.dumps(video_ids), max_results))
+
+
+def get_search_result(keyword: str) -> dict | None:
+    """
+    返回缓存的搜索结果 {"video_ids": [...], "max_results": int, "age_seconds": float}，没有则返回 None
+    旧数据没有记录 max_results，按结果条数算
+    """
+    with transaction(readonly=True) as conn:
+        row = conn.execute("""
+            SELECT video_ids, max_results,
+                   (julianday('now') - julianday(fetched_at)) * 86400
+            FROM search_cache
+            WHERE keyword = ?
+        """, (keyword,)).fetchone()
+    if row is None:
+        return None
+    video_ids = json.loads(row[0])
+    return {
+        "video_ids": video_ids,
+        "max_results": row[1] if row[1] is not None else len(video_ids),
+        "age_seconds": row[2],
+    }
+
+
+def save_transcript(video_id: str, result: dict):
+    """缓存 fetch_transcript_auto 成功的结果"""
+    with transaction() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO transcripts
+                (video_id, language, is_generated, transcript, segments)
+            VALUES (?, ?, ?, ?, ?)
+        """, (video_id, result["language"], int(result.get("is_generated", False)),
+              result["transcript"], json.dumps(result["segments"], ensure_ascii=False)))
+
+
+def get_stored_transcript(video_id: str) -> dict | None:
+    """返回缓存的字幕，格式与 fetch_transcript_auto 的返回值相同；没有则返回 None"""
+    with transaction(readonly=True) as conn:
+        row = conn.execute("""
+            SELECT language, is_generated, transcript, segments
+            FROM transcripts
             WHERE video_id = ?
-            ORDER BY 
-                COALESCE(parent_id, comment_id),  -- 把回复归到对应的顶层评论旁边
-                parent_id IS NOT NULL,             -- 顶层评论在前
-                created_at ASC
-        """, (video_id,)).fetchall()
-    return [dict(r) for r in rows]
\ No newline at end of file
+        """, (video_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "success": True,
+        "transcript": row[2],
+        "segments": json.loads(row[3]),
+        "language": row[0],
+        "is_generated": bool(row[1]),
+        "error": None,
+    }
+
+
+def add_watched_product(product_id: str):
+    with transaction() as conn:
+        conn.execute("""
+            INSERT OR IGNORE INTO watched_products (product_id) VALUES (?)
+        """, (product_id,))
+
+
+def remove_watched_product(product_id: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM watched_products WHERE product_id = ?", (product_id,))
+
+
+def get_watched_products() -> list[str]:
+    with transaction(readonly=True) as conn:
+        rows = conn.execute("""
+            SELECT product_id FROM watched_products ORDER BY added_at
+        """).fetchall()
+    return [r[0] for r in rows]
+
+
+def mark_product_run(product_id: str, status: str):
+    """记录商品最近一次抓取的时间和结果"""
+    with transaction() as conn:
+        conn.execute("""
+            UPDATE watched_products
+            SET last_run_at = CURRENT_TIMESTAMP, last_status = ?
+            WHERE product_id = ?
+        """, (status, product_id))
+
+
+def save_products(products: list[Product]):
+    """写入 / 更新商品基础信息"""
+    with transaction() as conn:
+        conn.executemany("""
+            INSERT INTO products (product_id, name, shop_name, price)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (product_id) DO UPDATE
+            SET name       = excluded.name,
+                shop_name  = excluded.shop_name,
+                price      = excluded.price,
+                fetched_at = CURRENT_TIMESTAMP
+        """, [(p.product_id, p.name, p.shop_name, p.price) for p in products])
+
+
+def get_product(product_id: str) -> dict | None:
+    with transaction(readonly=True) as conn:
+        row = conn.execute("""
+            SELECT * FROM products WHERE product_id = ?
+        """, (product_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def save_reviews(product_id: str, reviews: list[Review]) -> int:
+    """批量写入评论（一个事务一次 executemany），已存在的 review_id 跳过；返回新写入的条数"""
+    with transaction() as conn:
+        before = conn.total_changes
+        conn.executemany("""
+            INSERT OR IGNORE INTO reviews
+                (review_id, product_id, username, rating, content, helpful_cnt, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(r.review_id, product_id, r.username, r.rating, r.content,
+               r.helpful_cnt, r.created_at) for r in reviews])
+        return conn.total_changes - before
+
+
+def get_reviews(product_id: str, since: str = None, limit: int = None) -> list[dict]:
+    """按时间倒序返回商品评论；since 只要这个时间之后的"""
+    sql = "SELECT * FROM reviews WHERE product_id = ?"
+    params = [product_id]
+    if since is not None:
+        sql += " AND created_at > ?"
+        params.append(since)
+    sql += " ORDER BY created_at DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with transaction(readonly=True) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(r) for r in rows]
+
+
+def iter_unanalyzed_reviews(product_id: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """按块流式读取还没做情感分析的评论，每块是 [{"review_id", "text"}]，可直接送进 preprocess"""
+    with read_connection() as conn:
+        cursor = conn.execute("""
+            SELECT review_id, COALESCE(content, '') AS text FROM reviews  -- 只打分的评论 content 为 NULL
+            WHERE product_id = ? AND sentiment_label IS NULL
+        """, (product_id,))
+        try:
+            while rows := cursor.fetchmany(chunk_size):
+                yield [dict(r) for r in rows]
+        finally:
+            cursor.close()
+
+
+def save_review_sentiment(results: list[dict]):
+    """将 clean_text + sentiment_label + sentiment_score 写回 reviews 表"""
+    with transaction() as conn:
+        conn.executemany("""
+            UPDATE reviews
+            SET clean_text      = ?,
+                sentiment_label = ?,
+                sentiment_score = ?
+            WHERE review_id = ?
+        """, [(r["clean_text"], r["sentiment_label"],
+               r["sentiment_score"], r["review_id"]) for r in results])
+
+
+def mark_reviews_skipped(review_ids: list[str]):
+    """preprocess 过滤掉的评论（含只打分没写字的），同 mark_comments_skipped"""
+    with transaction() as conn:
+        conn.executemany("""
+            UPDATE reviews
+            SET clean_text = '', sentiment_label = ?, sentiment_score = NULL
+            WHERE review_id = ?
+        """, [(SKIPPED_LABEL, review_id) for review_id in review_ids])
+
+
+def get_review_sentiment_summary(product_id: str) -> dict:
+    """返回这个商品评论的情感统计"""
+    with transaction(readonly=True) as conn:
+        rows = conn.execute("""
+            SELECT sentiment_label, COUNT(*) as cnt
+            FROM reviews
+            WHERE product_id = ? AND sentiment_label IS NOT NULL AND sentiment_label != ?
+            GROUP BY sentiment_label
+        """, (product_id, SKIPPED_LABEL)).fetchall()
+
+    summary = {"positive": 0, "negative": 0, "neutral": 0}
+    for label, cnt in rows:
+        summary[label] = cnt
+    return summary
+
+
+def get_known_review_ids(product_id: str, limit: int = 1000) -> set[str]:
+    """
+    增量同步用：该商品最近存储的 review_id
+    评论按时间倒序抓取，碰到其中任意一条就说明后面都抓过了，不需要全量 id
+    """
+    with transaction(readonly=True) as conn:
+        rows = conn.execute("""
+            SELECT review_id FROM reviews
+            WHERE product_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        """, (product_id, limit)).fetchall()
+    return {r[0] for r in rows}
@@ -19,4 +19,21 @@ class Comment:
     like_count: int = 0
     reply_count: int = 0
     created_at: Optional[str] = None
-    parent_id: Optional[str] = None  # None 表示顶层评论，有值表示是某条评论的回复
\ No newline at end of file
+    parent_id: Optional[str] = None  # None 表示顶层评论，有值表示是某条评论的回复
+
+@dataclass
+class Product:
+    product_id: str
+    name: str
+    shop_name: str = ""
+    price: Optional[float] = None
+
+@dataclass
+class Review:
+    review_id: str
+    product_id: str
+    username: Optional[str] = None
+    rating: Optional[int] = None
+    content: Optional[str] = None
+    helpful_cnt: int = 0
+    created_at: Optional[str] = None
\ No newline at end of file
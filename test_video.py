@@ -1,11 +1,6 @@
-import httpx
+from scraper.http_client import api_get
 from storage.database import init_db, save_video, save_comments, get_all_comments
 from storage.models import Video, Comment
-from config import YOUTUBE_API_KEY
-
-VIDEO_URL    = "https://www.googleapis.com/youtube/v3/videos"
-THREADS_URL  = "https://www.googleapis.com/youtube/v3/commentThreads"
-COMMENTS_URL = "https://www.googleapis.com/youtube/v3/comments"
 
 
 def get_video_id_from_url(url: str) -> str:
@@ -17,13 +12,10 @@ def get_video_id_from_url(url: str) -> str:
 
 
 def fetch_video_info(video_id: str) -> Video:
-    resp = httpx.get(VIDEO_URL, params={
-        "key":  YOUTUBE_API_KEY,
+    item    = api_get("videos", {
         "id":   video_id,
         "part": "snippet,statistics",
-    })
-    resp.raise_for_status()
-    item    = resp.json()["items"][0]
+    })["items"][0]
     stats   = item.get("statistics", {})
     snippet = item.get("snippet", {})
     return Video(
@@ -43,7 +35,6 @@ def fetch_replies(parent_id: str, video_id: str) -> list[Comment]:
 
     while True:
         params = {
-            "key":       YOUTUBE_API_KEY,
             "parentId":  parent_id,
             "part":      "snippet",
             "maxResults": 100,
@@ -52,9 +43,7 @@ def fetch_replies(parent_id: str, video_id: str) -> list[Comment]:
             params["pageToken"] = next_page_token
 
         try:
-            resp = httpx.get(COMMENTS_URL, params=params, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
+            data = api_get("comments", params)
         except Exception as e:
             print(f"    [回复] 请求失败: {e}")
             break
@@ -86,7 +75,6 @@ def fetch_all_comments(video_id: str) -> list[Comment]:
 
     while True:
         params = {
-            "key":        YOUTUBE_API_KEY,
             "videoId":    video_id,
             "part":       "snippet,replies",  # replies 带最多5条回复预览
             "maxResults": 100,
@@ -96,9 +84,7 @@ def fetch_all_comments(video_id: str) -> list[Comment]:
             params["pageToken"] = next_page_token
 
         try:
-            resp = httpx.get(THREADS_URL, params=params, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
+            data = api_get("commentThreads", params)
         except Exception as e:
             print(f"[第 {page} 页] 请求失败: {e}")
             break
@@ -1,6 +1,16 @@
 from youtube_transcript_api import YouTubeTranscriptApi
+from concurrent.futures import Future
 import json
 import re
+import threading
+
+from storage.database import save_transcript, get_stored_transcript
+
+ENGLISH_CODES = ['en', 'en-US', 'en-GB']
+
+# video_id -> Future of the fetch currently running for it
+_inflight = {}
+_inflight_lock = threading.Lock()
 
 
 def clean_transcript_text(text: str) -> str:
@@ -22,9 +32,23 @@ def clean_transcript_text(text: str) -> str:
     return text.strip()
 
 
+def _pick_transcript(transcript_list, debug: bool):
+    """English track if there is one, otherwise the first available track"""
+    try:
+        return transcript_list.find_transcript(ENGLISH_CODES)
+    except Exception as e:
+        if debug:
+            print(f"  [DEBUG] ✗ No English transcript: {str(e)}")
+            print(f"  [DEBUG] Strategy 2: Using any available transcript...")
+    for transcript in transcript_list:
+        return transcript
+    raise LookupError("Transcript list is empty")
+
+
 def fetch_transcript_auto(video_id: str, debug: bool = True) -> dict:
     """
-    Fetch transcript using correct API methods
+    Fetch transcript: lists the available tracks once, then downloads only the
+    chosen one (English preferred, any language as fallback)
     """
     if debug:
         print(f"\n  [DEBUG] Attempting to fetch transcript for video_id: {video_id}")
@@ -33,9 +57,9 @@ def fetch_transcript_auto(video_id: str, debug: bool = True) -> dict:
         if debug:
             print(f"  [DEBUG] Fetching transcript...")
 
-        # Create an instance and fetch
         api = YouTubeTranscriptApi()
-        transcript_obj = api.fetch(video_id, languages=['en', 'en-US', 'en-GB'])
+        transcript = _pick_transcript(api.list(video_id), debug)
+        transcript_obj = transcript.fetch()
 
         # Convert to list of dicts
         segments = []
@@ -54,7 +78,7 @@ def fetch_transcript_auto(video_id: str, debug: bool = True) -> dict:
             full_text_parts.append(cleaned_text)
 
         if debug:
-            print(f"  [DEBUG] ✓ Got transcript with {len(segments)} segments")
+            print(f"  [DEBUG] ✓ Got {transcript.language_code} transcript with {len(segments)} segments")
             if len(segments) > 0:
                 print(f"  [DEBUG] First 3 segments:")
                 for i, seg in enumerate(segments[:3]):
@@ -66,50 +90,14 @@ def fetch_transcript_auto(video_id: str, debug: bool = True) -> dict:
             "success": True,
             "transcript": full_text,
             "segments": segments,
-            "language": "en",
+            "language": transcript.language_code,
+            "is_generated": transcript.is_generated,
             "error": None
         }
 
     except Exception as e:
         if debug:
-            print(f"  [DEBUG] ✗ English transcript failed: {str(e)}")
-            print(f"  [DEBUG] Strategy 2: Trying any available transcript...")
-
-        try:
-            # Try to fetch any available transcript (without language filter)
-            api = YouTubeTranscriptApi()
-            transcript_obj = api.fetch(video_id)
-
-            # Convert to list of dicts
-            segments = []
-            full_text_parts = []
-
-            for seg in transcript_obj:
-                cleaned_text = clean_transcript_text(seg.text)
-
-                segment_dict = {
-                    'text': cleaned_text,
-                    'start': seg.start,
-                    'duration': seg.duration
-                }
-                segments.append(segment_dict)
-                full_text_parts.append(cleaned_text)
-
-            if debug:
-                print(f"  [DEBUG] ✓ Got transcript with {len(segments)} segments")
-
-            full_text = " ".join(full_text_parts)
-
-            return {
-                "success": True,
-                "transcript": full_text,
-                "segments": segments,
-                "language": "auto-detected",
-                "error": None
-            }
-        except Exception as e2:
-            if debug:
-                print(f"  [DEBUG] ✗ Failed to fetch any transcript: {str(e2)}")
+            print(f"  [DEBUG] ✗ Failed to fetch any transcript: {str(e)}")
 
     # If all failed
     return {
@@ -121,6 +109,44 @@ def fetch_transcript_auto(video_id: str, debug: bool = True) -> dict:
     }
 
 
+def get_transcript(video_id: str, debug: bool = False) -> dict:
+    """
+    Cached transcript lookup.
+    Successful fetches are stored in the transcripts table; concurrent callers
+    asking for the same video share one in-flight fetch.
+    """
+    cached = get_stored_transcript(video_id)
+    if cached:
+        return cached
+
+    with _inflight_lock:
+        future = _inflight.get(video_id)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[video_id] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        # Looked up again as the owner: another owner may have stored it and
+        # left _inflight between the check above and our registration
+        result = get_stored_transcript(video_id)
+        if not result:
+            result = fetch_transcript_auto(video_id, debug=debug)
+            if result["success"]:
+                save_transcript(video_id, result)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(video_id, None)
+
+
 def export_transcript(video_id: str, result: dict, output_dir: str = "comments"):
     """Export transcript to file"""
     import os